@@ -4,7 +4,15 @@ from flask import Flask
 def create_app():
     app = Flask(__name__)
 
-    from app import routes
+    # Bring the meal library up to the current schema before serving
+    from app import schema
+    schema.migrate()
+
+    from app import assets, compression, metrics, profiling, routes
+    metrics.init_app(app)
+    profiling.init_app(app)
+    compression.init_app(app)
+    assets.init_app(app)
     routes.init_app(app)
 
     return app
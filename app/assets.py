@@ -0,0 +1,177 @@
+# app/assets.py
+"""
+Fingerprinted, long-cached static assets.
+
+Templates link assets with `asset_url("css/base.css")`, which returns
+/assets/css/base.<hash>.css where the hash comes from the file contents.
+Such a URL always names the same bytes, so it is served with a year-long
+immutable Cache-Control: browsers fetch an asset again only after it is
+edited (which changes its URL).
+
+`python -m app.assets` is the build step. It writes gzip (and, with the
+optional `brotli` package, brotli) copies of every compressible asset to
+static/dist/, named by hash, and these are sent to clients that accept
+them. Without a build the original files are served uncompressed.
+"""
+
+import hashlib
+import mimetypes
+import os
+import re
+import shutil
+
+from flask import abort, current_app, request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+from app import compression
+
+HASH_LENGTH = 12
+ASSET_MAX_AGE = 365 * 24 * 60 * 60
+IMMUTABLE = f"public, max-age={ASSET_MAX_AGE}, immutable"
+
+# Precompressed copies, under the static folder
+DIST_DIR = "dist"
+PRECOMPRESSED_EXTENSIONS = {".css", ".html", ".js", ".json", ".map", ".svg", ".txt"}
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+BUILD_LEVELS = {"br": 11, "gzip": 9}
+
+FINGERPRINTED_NAME = re.compile(
+    rf"^(?P<stem>.+)\.(?P<hash>[0-9a-f]{{{HASH_LENGTH}}})(?P<ext>\.[^./]+)$"
+)
+
+# Source path -> (mtime_ns, size, hash); files are re-hashed when edited
+_hashes = {}
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def fingerprinted_name(filename, digest):
+    """css/base.css -> css/base.<digest>.css"""
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}.{digest}{ext}"
+
+
+def fingerprint(static_folder, filename):
+    """
+    Returns the content hash of a static file, or None if there is no such
+    file inside `static_folder`.
+    """
+    path = safe_join(static_folder, filename)
+    if path is None or not os.path.isfile(path):
+        return None
+
+    st = os.stat(path)
+    cached = _hashes.get(path)
+    if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+        return cached[2]
+    with open(path, "rb") as f:
+        digest = content_hash(f.read())
+    _hashes[path] = (st.st_mtime_ns, st.st_size, digest)
+    return digest
+
+
+def asset_url(filename):
+    """URL of a static asset that changes whenever its contents do."""
+    digest = fingerprint(current_app.static_folder, filename)
+    if digest is None:
+        return url_for("static", filename=filename)
+    return url_for("assets", filename=fingerprinted_name(filename, digest))
+
+
+def init_app(app):
+    """Registers the /assets route and the `asset_url` template helper."""
+    app.add_template_global(asset_url)
+
+    @app.route("/assets/<path:filename>")
+    def assets(filename):
+        """Serves a fingerprinted asset, precompressed when possible."""
+        match = FINGERPRINTED_NAME.match(filename)
+        if match is None:
+            abort(404)
+        source = match["stem"] + match["ext"]
+        digest = fingerprint(app.static_folder, source)
+        if digest is None:
+            abort(404)
+        if digest != match["hash"]:
+            # An outdated URL, e.g. from a cached page: current contents,
+            # but not cached as if they were the old ones
+            return send_from_directory(app.static_folder, source, max_age=0)
+
+        response = _send_precompressed(app.static_folder, filename, source)
+        if response is None:
+            response = send_from_directory(app.static_folder, source)
+        response.headers["Cache-Control"] = IMMUTABLE
+        return response
+
+
+def _send_precompressed(static_folder, filename, source):
+    dist = os.path.join(static_folder, DIST_DIR)
+    built = [
+        encoding
+        for encoding, suffix in ENCODING_SUFFIXES.items()
+        if os.path.isfile(os.path.join(dist, filename + suffix))
+    ]
+    if not built:
+        return None
+
+    encoding = compression.choose_encoding(request.accept_encodings, built)
+    if encoding is None:
+        response = send_from_directory(static_folder, source)
+    else:
+        response = send_from_directory(
+            dist,
+            filename + ENCODING_SUFFIXES[encoding],
+            mimetype=mimetypes.guess_type(source)[0],
+        )
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def build(static_folder):
+    """
+    Rebuilds static/dist/ with precompressed copies of every compressible
+    asset, keeping only those smaller than the original. Returns a list of
+    (asset, encoding, original bytes, compressed bytes).
+    """
+    dist = os.path.join(static_folder, DIST_DIR)
+    shutil.rmtree(dist, ignore_errors=True)
+
+    written = []
+    for root, dirs, files in os.walk(static_folder):
+        if root == static_folder:
+            dirs[:] = [d for d in dirs if d != DIST_DIR]
+        for name in sorted(files):
+            if os.path.splitext(name)[1] not in PRECOMPRESSED_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            filename = os.path.relpath(path, static_folder).replace(os.sep, "/")
+            with open(path, "rb") as f:
+                data = f.read()
+
+            target = os.path.join(
+                dist, fingerprinted_name(filename, content_hash(data))
+            )
+            for encoding in compression.available_encodings():
+                packed = compression.compress(data, encoding, BUILD_LEVELS[encoding])
+                if len(packed) >= len(data):
+                    continue
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target + ENCODING_SUFFIXES[encoding], "wb") as f:
+                    f.write(packed)
+                written.append((filename, encoding, len(data), len(packed)))
+    return written
+
+
+def main():
+    static_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+    for filename, encoding, size, packed in build(static_folder):
+        print(f"{filename:<28} {encoding:<5} {size:>8} -> {packed:>8} bytes")
+    if compression.brotli is None:
+        print("brotli is not installed; wrote gzip copies only")
+
+
+if __name__ == "__main__":
+    main()
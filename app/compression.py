@@ -0,0 +1,92 @@
+# app/compression.py
+"""
+On-the-fly compression of large text responses (JSON, HTML, CSV, ...) for
+clients that accept it.
+
+Brotli is used when the optional `brotli` package is installed and the
+client accepts it, gzip otherwise. Streamed responses (plan batches,
+exports) and files sent straight from disk are passed through untouched.
+"""
+
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional; gzip alone is fine
+    brotli = None
+
+# Smaller bodies fit in a packet or two; compressing them gains nothing
+MIN_COMPRESS_SIZE = 1024
+
+COMPRESSIBLE_MIMETYPES = {
+    "application/javascript",
+    "application/json",
+    "application/x-ndjson",
+    "image/svg+xml",
+    "text/css",
+    "text/csv",
+    "text/html",
+    "text/javascript",
+    "text/plain",
+}
+
+# Fast settings for per-request work; the asset build uses the maximum
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def available_encodings():
+    """Content codings this process can produce, most preferred first."""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def choose_encoding(accept_encodings, offered):
+    """Returns the first of `offered` the client accepts, or None."""
+    for encoding in offered:
+        if accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def compress(data, encoding, level=None):
+    """Compresses bytes as "br" or "gzip" (deterministically, for caching)."""
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY if level is None else level)
+    return gzip.compress(data, GZIP_LEVEL if level is None else level, mtime=0)
+
+
+def init_app(app):
+    """
+    Compresses eligible responses. Flask runs after_request hooks in reverse
+    registration order, so this runs before the metrics and profiling hooks
+    registered earlier (their timings include compression) and after any
+    registered later.
+    """
+
+    @app.after_request
+    def compress_response(response):
+        if (
+            response.status_code != 200
+            or response.is_streamed
+            or response.direct_passthrough
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES
+        ):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        if (response.content_length or 0) < MIN_COMPRESS_SIZE:
+            return response
+        encoding = choose_encoding(request.accept_encodings, available_encodings())
+        if encoding is None:
+            return response
+
+        response.set_data(compress(response.get_data(), encoding))
+        response.headers["Content-Encoding"] = encoding
+        # The compressed body is a different representation of the same plan
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,128 @@
+# app/db.py
+"""Shared SQLite access for the meal library."""
+
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+DEFAULT_DB_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "meal-library", "meal_library.db")
+)
+
+# Idle connections kept per database, and prepared statements kept per connection
+POOL_SIZE = 8
+STATEMENT_CACHE_SIZE = 256
+BUSY_TIMEOUT_SECONDS = 5.0
+
+# Applied to every new connection. WAL lets readers keep going while
+# /add-meal or /upload-meal-library is writing.
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 268435456",
+)
+
+
+def get_db_path():
+    """Absolute path of the meal library database (UFUEL_DB_PATH overrides it)."""
+    return os.path.abspath(os.environ.get("UFUEL_DB_PATH") or DEFAULT_DB_PATH)
+
+
+def connect(db_path=None):
+    """Opens a new, tuned connection. Callers own it and must close it."""
+    conn = sqlite3.connect(
+        db_path or get_db_path(),
+        timeout=BUSY_TIMEOUT_SECONDS,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        check_same_thread=False,
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+# --- Connection pool ---
+
+_pools = {}
+_pools_lock = threading.Lock()
+_pools_pid = os.getpid()
+_local = threading.local()
+
+
+def _pool(db_path):
+    global _pools, _pools_pid
+    with _pools_lock:
+        # Connections must not cross a fork; worker processes start fresh
+        if _pools_pid != os.getpid():
+            _pools = {}
+            _pools_pid = os.getpid()
+        return _pools.setdefault(db_path, queue.LifoQueue(maxsize=POOL_SIZE))
+
+
+@contextmanager
+def connection(db_path=None):
+    """
+    Checks a pooled connection out for the current thread.
+    Nested calls on the same thread share one connection.
+    """
+    db_path = os.path.abspath(db_path or get_db_path())
+    held = _local.__dict__.setdefault("held", {})
+    if db_path in held:
+        yield held[db_path]
+        return
+
+    pool = _pool(db_path)
+    try:
+        conn = pool.get_nowait()
+    except queue.Empty:
+        conn = connect(db_path)
+
+    held[db_path] = conn
+    try:
+        yield conn
+    finally:
+        del held[db_path]
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+
+@contextmanager
+def transaction(db_path=None):
+    """
+    Runs a write transaction on a pooled connection, committing on success
+    and rolling back on error. The write lock is taken up front so two
+    writers never deadlock upgrading from a read.
+    """
+    with connection(db_path) as conn:
+        if conn.in_transaction:
+            # Already inside an outer transaction on this thread
+            yield conn
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+def close_all():
+    """Closes every idle pooled connection (e.g. before replacing the file)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        while True:
+            try:
+                pool.get_nowait().close()
+            except queue.Empty:
+                break
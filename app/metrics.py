@@ -0,0 +1,173 @@
+# app/metrics.py
+"""
+In-process counters and latency histograms, exposed on /metrics in the
+Prometheus text format.
+
+Recording is a dict lookup and a couple of additions under a lock; the
+text is only built when /metrics is scraped. Values are per process, so
+work done in /generate-plans worker processes is not counted.
+"""
+
+import bisect
+import threading
+import time
+
+from flask import g, request
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds (seconds) shared by every latency histogram
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{name}="{_escape(value)}"' for name, value in pairs)
+    return "{" + body + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count, optionally split by labels."""
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        """Adds `amount` to the series for `labels` (in labelnames order)."""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(
+                f"{self.name}{_format_labels(self.labelnames, labels)} "
+                f"{_format_value(value)}"
+            )
+        return lines
+
+
+class Histogram:
+    """Observations bucketed by upper bound, optionally split by labels."""
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last is +Inf), sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        """Records one observation for the series `labels`."""
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                counts = [0] * (len(self.buckets) + 1)
+                series = self._series[labels] = [counts, 0.0]
+            series[0][slot] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(
+                (labels, (list(counts), total))
+                for labels, (counts, total) in self._series.items()
+            )
+        bounds = self.buckets + (float("inf"),)
+        for labels, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = _format_labels(
+                    self.labelnames, labels, [("le", _format_value(bound))]
+                )
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            suffix = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{suffix} {_format_value(total)}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+# --- Registry ---
+
+REQUEST_SECONDS = Histogram(
+    "ufuel_request_duration_seconds",
+    "Time spent handling a request, by route, method and status.",
+    ("route", "method", "status"),
+)
+PLAN_STAGE_SECONDS = Histogram(
+    "ufuel_plan_stage_duration_seconds",
+    "Time spent in each stage of generating a meal plan.",
+    ("stage",),
+)
+FALLBACK_ITEMS = Counter(
+    "ufuel_fallback_items_total",
+    "Placeholder items served because no real meal or drink fit.",
+    ("kind",),
+)
+COMBINATIONS_EVALUATED = Counter(
+    "ufuel_combinations_evaluated_total",
+    "In-range combinations considered when choosing food and drinks.",
+    ("source",),
+)
+
+METRICS = (
+    REQUEST_SECONDS,
+    PLAN_STAGE_SECONDS,
+    FALLBACK_ITEMS,
+    COMBINATIONS_EVALUATED,
+)
+
+
+def render():
+    """Returns every metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def init_app(app):
+    """Times every request by its route pattern (not its raw path)."""
+
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_latency(response):
+        started = g.pop("metrics_started", None)
+        if started is not None:
+            # Streamed responses are timed until their first byte is ready
+            rule = request.url_rule.rule if request.url_rule else "unmatched"
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                rule,
+                request.method,
+                str(response.status_code),
+            )
+        return response
@@ -0,0 +1,146 @@
+# app/profiling.py
+"""
+Opt-in cProfile hook for live requests.
+
+Profiling is off unless a profile directory is configured:
+
+    UFUEL_PROFILE_DIR          where profiles are written (enables the hook)
+    UFUEL_PROFILE_SAMPLE_RATE  fraction of requests profiled (default 0)
+    UFUEL_PROFILE_TOKEN        if set, the header must carry this value
+
+A request sending `X-UFuel-Profile: 1` (or the token) is always profiled.
+Each profile is written to <dir>/<route>/ as a .prof file for pstats or
+snakeviz plus a .collapsed file for flamegraph.pl or speedscope, and its
+name is returned in the X-UFuel-Profile-Id response header.
+"""
+
+import cProfile
+import logging
+import os
+import pstats
+import random
+import re
+import time
+
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-UFuel-Profile"
+PROFILE_ID_HEADER = "X-UFuel-Profile-Id"
+
+# Deepest caller chain followed when rebuilding collapsed stacks
+MAX_STACK_DEPTH = 64
+
+
+def init_app(app):
+    """Registers the profiler when PROFILE_DIR (or UFUEL_PROFILE_DIR) is set."""
+    app.config.setdefault("PROFILE_DIR", os.environ.get("UFUEL_PROFILE_DIR"))
+    app.config.setdefault(
+        "PROFILE_SAMPLE_RATE", float(os.environ.get("UFUEL_PROFILE_SAMPLE_RATE", 0))
+    )
+    app.config.setdefault("PROFILE_TOKEN", os.environ.get("UFUEL_PROFILE_TOKEN"))
+    if not app.config["PROFILE_DIR"]:
+        return
+
+    @app.before_request
+    def start_profile():
+        if not _should_profile(app.config):
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another request on this process is already being profiled
+            return
+        g.profile = profile
+        g.profile_id = "{}-{}-{:x}".format(
+            time.strftime("%Y%m%d-%H%M%S"), os.getpid(), id(profile)
+        )
+
+    @app.after_request
+    def add_profile_header(response):
+        if "profile_id" in g:
+            response.headers[PROFILE_ID_HEADER] = g.profile_id
+        return response
+
+    @app.teardown_request
+    def finish_profile(exc):
+        profile = g.pop("profile", None)
+        if profile is None:
+            return
+        profile.disable()
+        try:
+            write_profile(profile, app.config["PROFILE_DIR"], g.profile_id)
+        except OSError:
+            logger.exception("Could not write request profile")
+
+
+def _should_profile(config):
+    requested = request.headers.get(PROFILE_HEADER)
+    if requested:
+        token = config["PROFILE_TOKEN"]
+        return requested == token if token else requested == "1"
+    rate = config["PROFILE_SAMPLE_RATE"]
+    return rate > 0 and random.random() < rate
+
+
+def route_slug():
+    """Filesystem-safe name for the matched route, e.g. generate-plan."""
+    rule = request.url_rule.rule if request.url_rule else "unmatched"
+    return re.sub(r"[^A-Za-z0-9_.-]+", "-", rule).strip("-") or "index"
+
+
+def write_profile(profile, directory, profile_id):
+    """Writes `profile` as <directory>/<route>/<profile_id>.prof and .collapsed."""
+    directory = os.path.join(directory, route_slug())
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, profile_id)
+
+    stats = pstats.Stats(profile)
+    stats.dump_stats(base + ".prof")
+    with open(base + ".collapsed", "w") as f:
+        for stack, micros in sorted(collapsed_stacks(stats).items()):
+            f.write(f"{stack} {micros}\n")
+    logger.info("Wrote request profile %s", base)
+
+
+def collapsed_stacks(stats):
+    """
+    Approximates collapsed stacks ("root;caller;func" -> microseconds) from
+    cProfile's caller graph. cProfile only records one level of callers, so
+    a function's own time is split across its callers in proportion to the
+    time each call edge accounts for.
+    """
+    entries = stats.stats
+    stacks = {}
+
+    def label(func):
+        filename, line, name = func
+        if filename == "~":
+            return name  # built-in
+        return f"{os.path.basename(filename)}:{line}({name})"
+
+    def add_paths(func, path, share, depth):
+        if share < 1e-6:
+            return  # below the 1us resolution of the output
+        callers = entries.get(func, (0, 0, 0, 0, {}))[4]
+        callers = {c: edge for c, edge in callers.items() if c not in path}
+        if not callers or depth >= MAX_STACK_DEPTH:
+            key = ";".join(label(f) for f in reversed(path))
+            stacks[key] = stacks.get(key, 0) + share
+            return
+        total = sum(edge[3] for edge in callers.values())
+        for caller, edge in callers.items():
+            weight = edge[3] / total if total else 1 / len(callers)
+            add_paths(caller, path + (caller,), share * weight, depth + 1)
+
+    for func, (_, _, own_time, _, _) in entries.items():
+        if own_time > 0:
+            add_paths(func, (func,), own_time, 0)
+
+    return {
+        stack: round(seconds * 1_000_000)
+        for stack, seconds in stacks.items()
+        if seconds * 1_000_000 >= 1
+    }
@@ -1,29 +1,71 @@
 # app/routes.py
 """Perform Backend Routing for Flask Server"""
 
-from flask import render_template, jsonify, request
+from flask import render_template, jsonify, request, Response, stream_with_context
 from werkzeug.utils import secure_filename
 import os
 import sqlite3
 import csv
+import json
+import time
+
+from app import metrics
 
 # Service imports
-from app.services.meal_planner import generate_full_meal_plan
+from app.services.meal_planner import generate_full_meal_plan, generate_meal_plans
+from app.services.meal_planner import plan_cache_key, plan_etag
+from app.services.meal_generator import plan_index_stats
+from app.services.demand_forecast import forecast_demand
 from app.services.meal_library_upload import replace_meal_library_from_csv
-from app.services.meal_library_viewer import view_all_meals
-from app.services.meal_library_viewer import get_meal_names_and_locations
-from app.services.meal_library_addition import add_single_meal
+from app.services.meal_library_upload import apply_meal_library_delta_from_csv
+from app.services.meal_library_viewer import list_meals, DEFAULT_PAGE_SIZE
+from app.services.meal_library_viewer import search_meals, DEFAULT_SEARCH_LIMIT
+from app.services.meal_library_addition import add_single_meal, add_meals
 from app.services.meal_library_deletion import delete_meal_by_name_and_location
+from app.services.meal_library_export import export_meals, EXPORT_FORMATS
 
 # Config
 ALLOWED_EXTENSIONS = {"csv"}
 
+# Form/query values accepted as "yes" for checkbox-style options
+TRUTHY_VALUES = ("1", "true", "on")
+
+# Seconds clients and shared caches may reuse a seeded plan before revalidating
+PLAN_MAX_AGE = 300
+
+# Query parameters of GET /generate-plan that are numbers
+NUMERIC_PROFILE_FIELDS = ("age", "height_in", "weight_lb")
+
 
 def allowed_file(filename):
     """Validates file extension *.csv for the upload meal.csv."""
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+def read_ndjson(stream):
+    """
+    Yields one decoded JSON object per non-blank line of a request stream.
+    A line that is not valid JSON yields a ValueError in its place, so the
+    caller can report it by position and carry on with the rest.
+    """
+    for line in stream:
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield ValueError(f"Invalid JSON: {e}")
+
+
+def profile_from_args(args):
+    """Builds a plan request from GET /generate-plan query parameters."""
+    data = args.to_dict()
+    for field in NUMERIC_PROFILE_FIELDS:
+        if field in data:
+            data[field] = float(data[field])
+    return data
+
+
 def init_app(app):
     """Registers all routes for the UFUEL Flask application."""
 
@@ -39,20 +81,115 @@ def init_app(app):
         """Renders the meal plan generator page."""
         return render_template("generator.html")
 
-    @app.route("/generate-plan", methods=["POST"])
+    @app.route("/generate-plan", methods=["GET", "POST"])
     def generate_plan():
-        """Generates a personalized meal plan based on user input."""
+        """
+        Generates a personalized meal plan based on user input, sent as JSON
+        or (for GET) as query parameters. Seeded plans carry an ETag and may
+        be cached; a matching If-None-Match gets a 304 without regenerating.
+        """
         try:
-            data = request.get_json()
+            if request.method == "GET":
+                data = profile_from_args(request.args)
+            else:
+                data = request.get_json()
             if not data:
                 return jsonify({"error": "No input received"}), 400
 
-            result = generate_full_meal_plan(data)
-            return jsonify(result), 200
+            key = plan_cache_key(data)
+            etag = plan_etag(key) if key is not None else None
+            # Weak comparison: compressed responses carry a weak ETag
+            if etag is not None and request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                result = generate_full_meal_plan(data)
+                started = time.perf_counter()
+                response = jsonify(result)
+                metrics.PLAN_STAGE_SECONDS.observe(
+                    time.perf_counter() - started, "serialize"
+                )
+                # A plan cut short by the search budget may differ next time
+                if not result["meal_plan"]["exact"]:
+                    etag = None
+
+            if etag is None:
+                response.headers["Cache-Control"] = "no-store"
+            else:
+                response.set_etag(etag)
+                response.headers["Cache-Control"] = f"public, max-age={PLAN_MAX_AGE}"
+            return response
+
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
+    @app.route("/generate-plans", methods=["POST"])
+    def generate_plans():
+        """
+        Generates meal plans for a cohort. Accepts a JSON array of user
+        profiles or an NDJSON body (one profile per line) and streams back
+        one NDJSON result per profile, in input order.
+        """
+        try:
+            if request.mimetype == "application/x-ndjson":
+                profiles = read_ndjson(request.stream)
+            else:
+                profiles = request.get_json(silent=True)
+                if not isinstance(profiles, list):
+                    return jsonify({"error": "Expected a JSON array of profiles"}), 400
+
+            def stream():
+                for result in generate_meal_plans(profiles):
+                    yield json.dumps(result) + "\n"
+
+            return Response(
+                stream_with_context(stream()), mimetype="application/x-ndjson"
+            )
+
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @app.route("/forecast-demand", methods=["POST"])
+    def forecast_demand_endpoint():
+        """
+        Forecasts portions per item and location for a simulated population.
+        JSON body: `population` (field distributions), `size`, and optional
+        `replicates`, `confidence` and `seed`.
+        """
+        try:
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                return jsonify({"error": "Expected a JSON object"}), 400
+
+            options = {
+                k: data[k]
+                for k in ("size", "replicates", "confidence", "seed")
+                if k in data
+            }
+            return jsonify(forecast_demand(data.get("population"), **options)), 200
+
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @app.route("/index-stats")
+    def index_stats():
+        """Reports build time and memory of the plan combination index."""
+        try:
+            return jsonify(plan_index_stats()), 200
+
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @app.route("/metrics")
+    def metrics_endpoint():
+        """Exposes request latencies and plan counters for Prometheus."""
+        return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
     @app.route("/about")
     def about():
         """Renders the About page."""
@@ -69,7 +206,11 @@ def init_app(app):
 
     @app.route("/upload-meal-library", methods=["POST"])
     def upload_meal_library():
-        """Uploads and replace the meal library CSV."""
+        """
+        Uploads and replace the meal library CSV.
+        With `mode=delta` only the differences are applied and returned;
+        `dry_run=1` reports them without writing.
+        """
         try:
             if "file" not in request.files:
                 return jsonify({"error": "No file part in request"}), 400
@@ -81,7 +222,14 @@ def init_app(app):
             if not allowed_file(file.filename):
                 return jsonify({"error": "Invalid file type. Only CSV allowed."}), 400
 
-            result = replace_meal_library_from_csv(file)
+            mode = request.values.get("mode", "replace")
+            if mode == "delta":
+                dry_run = request.values.get("dry_run", "").lower() in TRUTHY_VALUES
+                result = apply_meal_library_delta_from_csv(file, dry_run=dry_run)
+            elif mode == "replace":
+                result = replace_meal_library_from_csv(file)
+            else:
+                return jsonify({"error": "mode must be 'replace' or 'delta'"}), 400
             status = 200 if "message" in result else 500
             return jsonify(result), status
 
@@ -92,15 +240,72 @@ def init_app(app):
 
     @app.route("/view-meals")
     def view_meals():
-        """Displays the full meal database in an HTML table."""
+        """Renders the meal library viewer; rows are paged in from /api/meals."""
+        return render_template("view-meals.html")
+
+    @app.route("/api/meals")
+    def api_meals():
+        """Returns one keyset-paginated, filtered and sorted page of meals."""
+        try:
+            page, error = list_meals(
+                location=request.args.get("location"),
+                meal_type=request.args.get("meal_type"),
+                min_calories=request.args.get("min_calories", type=float),
+                max_calories=request.args.get("max_calories", type=float),
+                sort=request.args.get("sort", "name"),
+                order=request.args.get("order", "asc"),
+                limit=request.args.get("limit", DEFAULT_PAGE_SIZE, type=int),
+                cursor=request.args.get("cursor"),
+            )
+            if error:
+                return jsonify({"error": error}), 500
+            return jsonify(page), 200
+
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @app.route("/export-meals")
+    def export_meals_endpoint():
+        """
+        Streams the meal library as CSV (default) or NDJSON, with the same
+        filters as /api/meals. The CSV can be uploaded again unchanged.
+        """
+        try:
+            fmt = request.args.get("format", "csv")
+            chunks = export_meals(
+                fmt,
+                location=request.args.get("location"),
+                meal_type=request.args.get("meal_type"),
+                min_calories=request.args.get("min_calories", type=float),
+                max_calories=request.args.get("max_calories", type=float),
+            )
+            return Response(
+                stream_with_context(chunks),
+                mimetype=EXPORT_FORMATS[fmt],
+                headers={"Content-Disposition": f"attachment; filename=meals.{fmt}"},
+            )
+
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    @app.route("/api/meals/search")
+    def api_meals_search():
+        """Typeahead: returns the top meals whose name/location match `q`."""
         try:
-            meals, error = view_all_meals()
+            limit = request.args.get("limit", DEFAULT_SEARCH_LIMIT, type=int)
+            results, error = search_meals(request.args.get("q", ""), limit)
             if error:
-                return f"<h2>Error loading meals: {error}</h2>", 500
-            return render_template("view-meals.html", meals=meals)
+                return jsonify({"error": error}), 500
+            return jsonify({"meals": results}), 200
 
         except Exception as e:
-            return f"<h2>Error loading meals: {str(e)}</h2>", 500
+            return jsonify({"error": str(e)}), 500
 
     # (Update) Meal Library Addition
 
@@ -119,36 +324,53 @@ def init_app(app):
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
+    @app.route("/add-meals", methods=["POST"])
+    def add_meals_bulk():
+        """
+        Adds many meals in one transaction from a JSON array or an NDJSON
+        body (one meal per line). Invalid rows are reported by index and,
+        unless `skip_invalid=1`, reject the whole batch.
+        """
+        try:
+            if request.mimetype == "application/x-ndjson":
+                meals = read_ndjson(request.stream)
+            else:
+                meals = request.get_json(silent=True)
+                if not isinstance(meals, list):
+                    return jsonify({"error": "Expected a JSON array of meals"}), 400
+
+            skip_invalid = request.args.get("skip_invalid", "").lower() in TRUTHY_VALUES
+            result = add_meals(meals, skip_invalid=skip_invalid)
+            status = 200 if "message" in result else 400
+            return jsonify(result), status
+
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
     # (Delete) Meal Library Deletion
 
     @app.route("/delete-meal", methods=["GET", "POST"])
     def delete_meal():
-        """Deletes a meal from the database and refresh the list."""
+        """Deletes a meal from the database; the page finds meals via typeahead."""
         message = None
         try:
             if request.method == "POST":
                 meal_value = request.form.get("meal")
                 if meal_value:
-                    # Each meal option in the dropdown is formatted as "name|location"
+                    # Each typeahead match is submitted as "name|location"
 
                     if "|" not in meal_value:
                         return jsonify({"error": "Invalid meal format"}), 400
                     # Split the value into its components
-                    name, location = meal_value.split("|")
+                    name, location = meal_value.rsplit("|", 1)
                     # Call deletion service
                     result = delete_meal_by_name_and_location(name, location)
                     message = result.get("message") or result.get("error")
 
                 else:
                     message = "No meal selected."
-            # Reload meal list so drop down is up to date after deletion.
-            meals, error = get_meal_names_and_locations()
-
-            if error:
-                return f"<h2>Error loading meals: {error}</h2>", 500
-
-            # Render delete meal page with the updated list and message
-            return render_template("delete-meal.html", meals=meals, message=message)
+            # Render delete meal page with the result message
+            return render_template("delete-meal.html", message=message)
 
         except Exception as e:
             return f"<h2>Error deleting meal: {str(e)}</h2>", 500
@@ -0,0 +1,172 @@
+# app/schema.py
+"""Versioned schema for the meal library and the migrations that build it."""
+
+from app import db
+
+# Latest schema version, stored in PRAGMA user_version
+SCHEMA_VERSION = 4
+
+# Canonical meals table. The *_key columns hold the normalized values the
+# generator and importers match on, so lookups can use plain indexes.
+MEALS_TABLE_SQL = """
+    CREATE TABLE {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        calories REAL,
+        carbohydrates REAL,
+        fat REAL,
+        protein REAL,
+        meal_type TEXT,
+        location TEXT,
+        name_key TEXT GENERATED ALWAYS AS (LOWER(TRIM(name))) STORED,
+        location_key TEXT GENERATED ALWAYS AS (LOWER(TRIM(location))) STORED,
+        meal_type_key TEXT GENERATED ALWAYS AS (LOWER(TRIM(meal_type))) STORED
+    )
+"""
+
+MEALS_INDEX_SQL = (
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_meals_key
+    ON meals (name_key, location_key, meal_type_key)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_meals_type_location_calories
+    ON meals (meal_type_key, location_key, calories)
+    """,
+    # Keyset pagination for /api/meals; the rowid (id) is the tie-breaker
+    "CREATE INDEX IF NOT EXISTS idx_meals_name ON meals (name)",
+    "CREATE INDEX IF NOT EXISTS idx_meals_calories ON meals (calories)",
+)
+
+# Full-text index over meal name and location for typeahead search. It
+# reads from meals (external content) and triggers keep it in sync.
+MEALS_SEARCH_SQL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS meals_fts USING fts5(
+        name, location, content='meals', content_rowid='id', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS meals_fts_insert AFTER INSERT ON meals BEGIN
+        INSERT INTO meals_fts (rowid, name, location)
+        VALUES (new.id, new.name, new.location);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS meals_fts_delete AFTER DELETE ON meals BEGIN
+        INSERT INTO meals_fts (meals_fts, rowid, name, location)
+        VALUES ('delete', old.id, old.name, old.location);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS meals_fts_update AFTER UPDATE ON meals BEGIN
+        INSERT INTO meals_fts (meals_fts, rowid, name, location)
+        VALUES ('delete', old.id, old.name, old.location);
+        INSERT INTO meals_fts (rowid, name, location)
+        VALUES (new.id, new.name, new.location);
+    END
+    """,
+)
+
+# Conflict target matching idx_meals_key, for upserts
+MEAL_KEY_COLUMNS = "name_key, location_key, meal_type_key"
+
+
+def create_meals_table(conn, table="meals"):
+    """Creates an empty meals table (without indexes) under `table`."""
+    conn.execute(MEALS_TABLE_SQL.format(table=table))
+
+
+def create_meals_indexes(conn):
+    """Creates the indexes on the live meals table."""
+    for sql in MEALS_INDEX_SQL:
+        conn.execute(sql)
+
+
+def create_meals_search(conn):
+    """
+    Creates the search index and its triggers on the live meals table,
+    then rebuilds the index from the table's current rows.
+    """
+    for sql in MEALS_SEARCH_SQL:
+        conn.execute(sql)
+    conn.execute("INSERT INTO meals_fts (meals_fts) VALUES ('rebuild')")
+
+
+# --- Migrations ---
+
+
+def _migrate_v1(conn):
+    # Original table as created by meal-library/db_setup.py or the uploader
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS meals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            calories REAL,
+            carbohydrates REAL,
+            fat REAL,
+            protein REAL,
+            meal_type TEXT,
+            location TEXT
+        )
+    """
+    )
+
+
+def _migrate_v2(conn):
+    # Rebuild into the canonical table: REAL macros everywhere, stored
+    # normalized keys and indexes. Duplicate keys keep their first row.
+    create_meals_table(conn, "meals_migrating")
+    conn.execute(
+        """
+        INSERT INTO meals_migrating
+            (id, name, calories, carbohydrates, fat, protein, meal_type, location)
+        SELECT id, name, calories, carbohydrates, fat, protein, meal_type, location
+        FROM meals
+        WHERE id IN (
+            SELECT MIN(id) FROM meals
+            GROUP BY LOWER(TRIM(name)), LOWER(TRIM(location)), LOWER(TRIM(meal_type))
+        )
+        """
+    )
+    conn.execute("DROP TABLE meals")
+    conn.execute("ALTER TABLE meals_migrating RENAME TO meals")
+    create_meals_indexes(conn)
+
+
+def _migrate_v3(conn):
+    # Sort indexes for the paginated meal API
+    create_meals_indexes(conn)
+
+
+def _migrate_v4(conn):
+    # Full-text typeahead over name and location
+    create_meals_search(conn)
+
+
+MIGRATIONS = {
+    1: _migrate_v1,
+    2: _migrate_v2,
+    3: _migrate_v3,
+    4: _migrate_v4,
+}
+
+
+def schema_version(conn):
+    """Returns the schema version recorded in the database."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(db_path=None):
+    """
+    Upgrades the database in place to SCHEMA_VERSION, one migration per
+    transaction. Returns (version_before, version_after).
+    """
+    with db.connection(db_path) as conn:
+        before = schema_version(conn)
+        for version in range(before + 1, SCHEMA_VERSION + 1):
+            with db.transaction(db_path) as conn:
+                MIGRATIONS[version](conn)
+                conn.execute(f"PRAGMA user_version = {version}")
+        return before, schema_version(conn)
@@ -0,0 +1,216 @@
+# app/services/catalog_file.py
+"""
+Binary, memory-mappable snapshot of the meal catalog.
+
+Every worker process maps the same file read-only, so the library is held
+once in the page cache and a new worker can serve plans without querying
+SQLite or building per-meal objects. Layout (little-endian, sections
+8-byte aligned):
+
+    header         magic, source stamp, content digest, section sizes
+    columns        calories, carbs, fat, protein as float64[items]
+    name ids       uint32[items] into the string table
+    location ids   int32[items] into the string table, -1 for none
+    groups         (location id, meal_type id, first item, count) per group
+    string table   uint64[strings + 1] byte offsets, then UTF-8 text
+
+The stamp records the database file state the snapshot was built from,
+so readers can tell whether it is still current.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+MAGIC = b"UFCAT\x00\x00\x01"
+
+# magic, stamp (4 x int64), sha1 digest, padding, items, groups, strings, text bytes
+HEADER = struct.Struct("<8s4q20s4x4Q")
+GROUP = struct.Struct("<iIQQ")
+
+MACRO_COLUMNS = ("calories", "carbs", "fat", "protein")
+
+# Written next to the database, e.g. meal_library.db.catalog
+SNAPSHOT_SUFFIX = ".catalog"
+
+
+def snapshot_path(db_path):
+    return db_path + SNAPSHOT_SUFFIX
+
+
+def library_stamp(db_path):
+    """
+    Size and modification time of the database and its WAL file. Every
+    committed write changes it, whichever process made the write.
+    """
+    stamp = []
+    for path in (db_path, db_path + "-wal"):
+        try:
+            st = os.stat(path)
+            stamp += [st.st_size, st.st_mtime_ns]
+        except FileNotFoundError:
+            stamp += [0, 0]
+    return tuple(stamp)
+
+
+class StringColumn:
+    """Read-only sequence of strings stored as ids into a string table."""
+
+    __slots__ = ("ids", "table")
+
+    def __init__(self, ids, table):
+        self.ids = ids
+        self.table = table
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        return self.table[self.ids[i]]
+
+    def __iter__(self):
+        return (self.table[i] for i in self.ids)
+
+
+class StringTable:
+    """Strings decoded from the mapped text on first use, then kept."""
+
+    __slots__ = ("offsets", "text", "_decoded")
+
+    def __init__(self, offsets, text):
+        self.offsets = offsets
+        self.text = text
+        self._decoded = {}
+
+    def __getitem__(self, sid):
+        if sid < 0:
+            return None
+        value = self._decoded.get(sid)
+        if value is None:
+            raw = self.text[self.offsets[sid] : self.offsets[sid + 1]]
+            value = self._decoded[sid] = sys.intern(str(raw, "utf-8"))
+        return value
+
+
+def _padding(size):
+    return b"\x00" * (-size % 8)
+
+
+def serialize(groups, stamp):
+    """
+    Encodes catalog groups as snapshot bytes. Returns (data, digest); the
+    digest covers the contents only, not the stamp, so the same library
+    always gets the same digest.
+    """
+    strings = {}
+
+    def string_id(value):
+        if value is None:
+            return -1
+        sid = strings.get(value)
+        if sid is None:
+            sid = strings[value] = len(strings)
+        return sid
+
+    columns = {c: array("d") for c in MACRO_COLUMNS}
+    name_ids = array("I")
+    location_ids = array("i")
+    group_rows = []
+    for (location, meal_type), group in groups.items():
+        group_rows.append(
+            GROUP.pack(
+                string_id(location), string_id(meal_type), len(name_ids), len(group)
+            )
+        )
+        for column in MACRO_COLUMNS:
+            columns[column].extend(getattr(group, column))
+        name_ids.extend(string_id(name) for name in group.names)
+        location_ids.extend(string_id(loc) for loc in group.locations)
+
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = array("Q", [0])
+    for raw in encoded:
+        offsets.append(offsets[-1] + len(raw))
+    text = b"".join(encoded)
+
+    body = [columns[c].tobytes() for c in MACRO_COLUMNS]
+    ids = name_ids.tobytes() + location_ids.tobytes()
+    body += [ids, _padding(len(ids)), b"".join(group_rows), offsets.tobytes(), text]
+    body = b"".join(body)
+
+    digest = hashlib.sha1(body).digest()
+    header = HEADER.pack(
+        MAGIC, *stamp, digest, len(name_ids), len(group_rows), len(encoded), len(text)
+    )
+    return header + body, digest.hex()
+
+
+def write(path, groups, stamp):
+    """
+    Writes a snapshot atomically (readers see the old file or the new
+    one). Returns the content digest.
+    """
+    data, digest = serialize(groups, stamp)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return digest
+
+
+def read(path, group_factory):
+    """
+    Maps a snapshot read-only. Returns (stamp, digest, groups), with each
+    group built by `group_factory(names, locations, calories, carbs, fat,
+    protein)` over views into the mapping, or None if the file is missing
+    or not a snapshot.
+    """
+    try:
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        return None  # missing or empty
+
+    view = memoryview(mapped)
+    if len(view) < HEADER.size or view[:8] != MAGIC:
+        return None
+    try:
+        return _parse(view, group_factory)
+    except (ValueError, TypeError, struct.error):
+        return None  # truncated or from an incompatible build
+
+
+def _parse(view, group_factory):
+    _, *rest = HEADER.unpack_from(view)
+    stamp, digest = tuple(rest[:4]), rest[4].hex()
+    items, group_count, string_count, text_size = rest[5:]
+
+    pos = HEADER.size
+
+    def take(count, fmt, size):
+        nonlocal pos
+        section = view[pos : pos + count * size].cast(fmt)
+        pos += count * size
+        return section
+
+    columns = {c: take(items, "d", 8) for c in MACRO_COLUMNS}
+    name_ids = take(items, "I", 4)
+    location_ids = take(items, "i", 4)
+    pos += -pos % 8
+    group_rows = view[pos : pos + group_count * GROUP.size]
+    pos += group_count * GROUP.size
+    offsets = take(string_count + 1, "Q", 8)
+    table = StringTable(offsets, view[pos : pos + text_size])
+
+    groups = {}
+    for location, meal_type, start, count in GROUP.iter_unpack(group_rows):
+        end = start + count
+        groups[(table[location], table[meal_type])] = group_factory(
+            StringColumn(name_ids[start:end], table),
+            StringColumn(location_ids[start:end], table),
+            *(columns[c][start:end] for c in MACRO_COLUMNS),
+        )
+    return stamp, digest, groups
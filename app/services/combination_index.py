@@ -0,0 +1,276 @@
+# app/services/combination_index.py
+import bisect
+import hashlib
+import logging
+import random
+import time
+from array import array
+
+from app.metrics import COMBINATIONS_EVALUATED
+from app.services.meal_catalog import group_key
+
+logger = logging.getLogger(__name__)
+
+# Groups with more candidate combinations than this are served by the
+# live search instead of being indexed.
+MAX_INDEXED_COMBINATIONS = 500_000
+
+# Lower cap for the merged any-location groups: they are the largest and
+# change with every write to any location, so they are rebuilt each time
+MAX_MERGED_COMBINATIONS = 50_000
+
+# Random draws tried before giving up on an exclusion-filtered choose()
+REJECTION_ATTEMPTS = 32
+
+
+class CombinationIndex:
+    """
+    Every combination of up to `width` items from one calorie-sorted list
+    whose total stays under `max_total`, stored sorted by total.
+
+    Combinations are kept as fixed-width rows of offsets into the item
+    list (padded with `size`), so the combinations within tolerance of any
+    target are one contiguous slice. Windows for the expected `targets`
+    are precomputed, which makes serving a plan a table lookup plus a
+    random draw.
+    """
+
+    def __init__(
+        self, size, width, tolerance, max_total, totals, offsets, targets
+    ):
+        self.size = size
+        self.width = width
+        self.tolerance = tolerance
+        self.max_total = max_total
+        self.totals = totals
+        self.offsets = offsets
+        self.windows = {t: self._window(t) for t in targets}
+
+    def __len__(self):
+        return len(self.totals)
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the index arrays and window table."""
+        return (
+            self.totals.itemsize * len(self.totals)
+            + self.offsets.itemsize * len(self.offsets)
+            + 2 * 8 * len(self.windows)
+        )
+
+    def combo(self, k):
+        """Returns the item offsets of the k-th combination."""
+        row = self.offsets[k * self.width : (k + 1) * self.width]
+        return [i for i in row if i != self.size]
+
+    def choose(self, target, tolerance=0.1, rng=None, exclude=None):
+        """
+        Returns the offsets of a uniformly random combination within
+        tolerance of the target, or None when the index cannot answer
+        (nothing in range, or a target/tolerance it was not built for).
+        Combinations using an offset in `exclude` are rejected; if too many
+        draws are rejected, None is returned so the caller can search the
+        remaining items directly.
+        """
+        window = self.window(target, tolerance)
+        if window is None:
+            return None
+
+        lo, hi = window
+        if lo == hi:
+            return None
+        COMBINATIONS_EVALUATED.inc("index", amount=hi - lo)
+
+        rng = rng or random
+        if not exclude:
+            return self.combo(lo + rng.randrange(hi - lo))
+
+        for _ in range(REJECTION_ATTEMPTS):
+            combo = self.combo(lo + rng.randrange(hi - lo))
+            if exclude.isdisjoint(combo):
+                return combo
+        return None
+
+    def window(self, target, tolerance=0.1):
+        """
+        Returns the (lo, hi) slice of combinations within tolerance of the
+        target, or None for a target/tolerance the index was not built for.
+        """
+        if tolerance != self.tolerance:
+            return None
+
+        window = self.windows.get(target)
+        if window is None:
+            if target * (1 + tolerance) > self.max_total:
+                return None
+            window = self._window(target)
+        return window
+
+    def _window(self, target):
+        lower = target * (1 - self.tolerance)
+        upper = target * (1 + self.tolerance)
+        lo = bisect.bisect_left(self.totals, lower)
+        hi = bisect.bisect_right(self.totals, upper, lo)
+        return lo, hi
+
+
+def count_combinations(calories, max_total, max_items=3, limit=None):
+    """
+    Counts the combinations of up to `max_items` items from the ascending
+    `calories` list whose total is at most `max_total`, without listing
+    them: the last items of every prefix form a contiguous run, counted
+    with bisect. Stops early, returning a count above `limit`, once the
+    count exceeds it.
+    """
+    n = len(calories)
+    count = 0
+
+    def walk(start, partial, remaining):
+        nonlocal count
+        hi = bisect.bisect_right(calories, max_total - partial, start, n)
+        count += hi - start
+        if limit is not None and count > limit:
+            raise OverflowError
+        if remaining > 1:
+            for i in range(start, hi):
+                walk(i + 1, partial + calories[i], remaining - 1)
+
+    if n and max_items > 0:
+        try:
+            walk(0, 0.0, max_items)
+        except OverflowError:
+            pass
+    return count
+
+
+def build_combination_index(
+    calories,
+    targets,
+    max_items=3,
+    tolerance=0.1,
+    max_combinations=MAX_INDEXED_COMBINATIONS,
+):
+    """
+    Builds a CombinationIndex for the ascending `calories` list covering
+    every target in `targets`. Returns None if the group has more than
+    `max_combinations` candidate combinations; those are counted first, so
+    an oversized group is skipped without being enumerated.
+    """
+    targets = list(targets)
+    n = len(calories)
+    if n == 0 or not targets:
+        return None
+
+    max_total = max(targets) * (1 + tolerance)
+    if count_combinations(calories, max_total, max_items, max_combinations) > (
+        max_combinations
+    ):
+        return None
+
+    found_totals = []
+    found_combos = []
+
+    def walk(combo, start, partial, remaining):
+        for i in range(start, n):
+            total = partial + calories[i]
+            # Sorted order: every later item only pushes the total higher
+            if total > max_total:
+                break
+            found_totals.append(total)
+            found_combos.append(combo + (i,))
+            if remaining > 1:
+                walk(combo + (i,), i + 1, total, remaining - 1)
+
+    walk((), 0, 0.0, max_items)
+
+    order = sorted(range(len(found_totals)), key=found_totals.__getitem__)
+    totals = array("d", (found_totals[k] for k in order))
+    offsets = array("H" if n < 0xFFFF else "I")
+    for k in order:
+        combo = found_combos[k]
+        offsets.extend(combo)
+        offsets.extend([n] * (max_items - len(combo)))
+
+    return CombinationIndex(
+        n, max_items, tolerance, max_total, totals, offsets, targets
+    )
+
+
+class IndexSet:
+    """
+    A CombinationIndex per catalog group, plus build statistics and a
+    digest of every group's calories, so a later build can tell which
+    groups are unchanged.
+    """
+
+    def __init__(self, indexes, stats, digests=None):
+        self.indexes = indexes
+        self.stats = stats
+        self.digests = digests or {}
+
+    def get(self, meal_type, location=None):
+        """Returns the index for a catalog group, or None if it has none."""
+        return self.indexes.get(group_key(meal_type, location))
+
+
+def calories_digest(calories):
+    """Digest of a group's calories column (an array or memoryview)."""
+    return hashlib.blake2b(memoryview(calories).cast("B"), digest_size=16).digest()
+
+
+def build_index_set(groups, plan, previous=None, partial=False):
+    """
+    Indexes every catalog group whose meal type appears in `plan`, a dict
+    of meal_type -> (targets, max_items). Groups whose calories are the
+    same as in `previous`, an IndexSet built with the same plan, keep its
+    index (or lack of one) instead of being rebuilt. With `partial`, only
+    those are included and nothing is built. The merged any-location
+    groups are held to MAX_MERGED_COMBINATIONS.
+
+    Build time and memory are recorded in `stats` and logged, since this
+    runs after every library change.
+    """
+    started = time.perf_counter()
+    indexes = {}
+    digests = {}
+    skipped = reused = 0
+
+    for key, meals in groups.items():
+        if key[1] not in plan:
+            continue
+        targets, max_items = plan[key[1]]
+        digest = calories_digest(meals.calories)
+        if previous is not None and previous.digests.get(key) == digest:
+            index = previous.indexes.get(key)
+            reused += 1
+        elif partial:
+            continue
+        else:
+            index = build_combination_index(
+                meals.calories,
+                targets,
+                max_items,
+                max_combinations=(
+                    MAX_MERGED_COMBINATIONS
+                    if key[0] is None
+                    else MAX_INDEXED_COMBINATIONS
+                ),
+            )
+        digests[key] = digest
+        if index is None:
+            skipped += 1
+            continue
+        indexes[key] = index
+
+    stats = {
+        "build_seconds": round(time.perf_counter() - started, 4),
+        "indexed_groups": len(indexes),
+        "reused_groups": reused,
+        "skipped_groups": skipped,
+        "combinations": sum(len(i) for i in indexes.values()),
+        "bytes": sum(i.nbytes for i in indexes.values()),
+        "partial": partial,
+    }
+    if not partial:
+        logger.info("Built combination index: %s", stats)
+    return IndexSet(indexes, stats, digests)
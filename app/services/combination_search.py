@@ -0,0 +1,194 @@
+# app/services/combination_search.py
+import bisect
+import heapq
+import math
+import random
+import time
+
+from app.metrics import COMBINATIONS_EVALUATED
+
+# Search nodes visited between checks of the budget's clock
+BUDGET_CHECK_INTERVAL = 64
+
+
+class SearchBudget:
+    """
+    Wall-clock allowance shared by every search made for one request.
+    A search that runs out of time returns the best combination found so
+    far and sets `cut_short`, so callers can report the result as inexact.
+    """
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.deadline = time.perf_counter() + seconds
+        self.cut_short = False
+
+    @property
+    def exact(self):
+        """True while no search under this budget has been cut short."""
+        return not self.cut_short
+
+    def expired(self):
+        return time.perf_counter() >= self.deadline
+
+
+class _OutOfTime(Exception):
+    pass
+
+
+def search_combination(
+    calories, target, max_items=3, tolerance=0.1, rng=None, budget=None
+):
+    """
+    Picks a combination of up to `max_items` indices from the ascending
+    `calories` list.
+
+    Returns a uniformly random combination whose total is within
+    `tolerance` of the target, or the closest combination if none fit.
+    Combinations are never materialized: for every prefix of r - 1 items
+    the valid last items form a contiguous window of the sorted list, so
+    the windows are counted with bisect and one combination is kept by
+    weighted reservoir sampling. Prefixes are pruned on the smallest and
+    largest totals still reachable, which keeps 4-6 item searches
+    tractable.
+
+    With a SearchBudget, the search stops when the budget expires and
+    returns what it has found (smaller combinations are searched first);
+    the draw is then no longer uniform and `budget.cut_short` is set.
+    """
+    rng = rng or random
+    state = {"chosen": None}
+
+    def take(combo, lo, count, seen):
+        if rng.randrange(seen + count) < count:
+            state["chosen"] = combo + (lo + rng.randrange(count),)
+
+    best_combo = _search(calories, target, max_items, tolerance, budget, take)
+    if state["chosen"] is not None:
+        return list(state["chosen"])
+    return list(best_combo) if best_combo else None
+
+
+def sample_combinations(
+    calories, target, samples, max_items=3, tolerance=0.1, rng=None, budget=None
+):
+    """
+    Draws `samples` in-range combinations (uniformly, with replacement) in
+    one pass of the search_combination walk, e.g. as candidates for macro
+    scoring. Returns a list of index lists, empty if no combination fits.
+
+    Each draw keeps a skip-ahead reservoir: the position of its next
+    replacement is drawn in advance, so a window only costs a comparison
+    unless it holds one of those positions.
+    """
+    rng = rng or random
+    chosen = [None] * samples
+    upcoming = [(0, slot) for slot in range(samples)]  # (position, slot)
+
+    def take(combo, lo, count, seen):
+        while upcoming and upcoming[0][0] < seen + count:
+            position, slot = heapq.heappop(upcoming)
+            chosen[slot] = combo + (lo + position - seen,)
+            # P(no replacement before position m) = (position + 1) / m
+            following = math.floor((position + 1) / (1.0 - rng.random()))
+            heapq.heappush(upcoming, (max(following, position + 1), slot))
+
+    _search(calories, target, max_items, tolerance, budget, take)
+    if chosen[0] is None:
+        return []
+    return [list(combo) for combo in chosen]
+
+
+def _search(calories, target, max_items, tolerance, budget, take):
+    # Walks every prefix, passing each window of in-range last items to
+    # take(prefix, lo, count, seen), where `seen` counts the in-range
+    # combinations before it. Returns the closest combination found.
+    n = len(calories)
+    if n == 0 or max_items < 1:
+        return None
+    # Catalog groups store calories in an array('d'); a list avoids boxing
+    # a new float on every access in the loops below
+    calories = list(calories)
+
+    lower_bound = target * (1 - tolerance)
+    upper_bound = target * (1 + tolerance)
+
+    # prefix[i] = sum of the i smallest calories, used for pruning bounds
+    prefix = [0.0]
+    for cal in calories:
+        prefix.append(prefix[-1] + cal)
+
+    state = {
+        "nodes": 0,  # prefixes visited, for budget checks
+        "seen": 0,  # in-range combinations counted so far
+        "best_diff": float("inf"),
+        "best_combo": None,
+    }
+
+    # Seed the closest combination with r neighbouring items around
+    # target / r. A tight best_diff from the start lets the bounds below
+    # prune out-of-range prefixes early, and gives a budget-limited search
+    # a sensible answer even if it stops almost at once.
+    for r in range(1, min(max_items, n) + 1):
+        start = min(max(bisect.bisect_left(calories, target / r) - r // 2, 0), n - r)
+        diff = abs(prefix[start + r] - prefix[start] - target)
+        if diff < state["best_diff"]:
+            state["best_diff"] = diff
+            state["best_combo"] = tuple(range(start, start + r))
+
+    def pick_last(combo, start, partial):
+        # Every index in [lo, hi) completes an in-range combination
+        lo = bisect.bisect_left(calories, lower_bound - partial, start)
+        hi = bisect.bisect_right(calories, upper_bound - partial, lo)
+        count = hi - lo
+        if count:
+            take(combo, lo, count, state["seen"])
+            state["seen"] += count
+
+        # Closest last item sits on either side of the target remainder
+        pos = bisect.bisect_left(calories, target - partial, start)
+        for i in (pos - 1, pos):
+            if start <= i < n:
+                diff = abs(partial + calories[i] - target)
+                if diff < state["best_diff"]:
+                    state["best_diff"] = diff
+                    state["best_combo"] = combo + (i,)
+
+    def walk(combo, start, partial, remaining):
+        if budget is not None:
+            state["nodes"] += 1
+            if state["nodes"] % BUDGET_CHECK_INTERVAL == 0 and budget.expired():
+                raise _OutOfTime
+
+        if remaining == 1:
+            pick_last(combo, start, partial)
+            return
+
+        for i in range(start, n - remaining + 1):
+            # Smallest and largest totals reachable with this item next
+            low_total = partial + prefix[i + remaining] - prefix[i]
+            high_total = (
+                partial + calories[i] + prefix[n] - prefix[n - remaining + 1]
+            )
+
+            # Sorted order: every later item only pushes the total higher
+            if (
+                low_total > upper_bound
+                and low_total - target >= state["best_diff"]
+            ):
+                break
+            if (
+                high_total < lower_bound
+                and target - high_total >= state["best_diff"]
+            ):
+                continue
+
+            walk(combo + (i,), i + 1, partial + calories[i], remaining - 1)
+
+    try:
+        for r in range(1, min(max_items, n) + 1):
+            walk((), 0, 0.0, r)
+    except _OutOfTime:
+        budget.cut_short = True
+    COMBINATIONS_EVALUATED.inc("search", amount=state["seen"])
+    return state["best_combo"]
@@ -0,0 +1,306 @@
+# app/services/demand_forecast.py
+"""
+Forecasts how many portions of each item generated plans will call for.
+
+A simulated population is drawn from distributions over the plan request
+fields, its daily calorie targets are computed in one vectorized pass,
+and every person's single-day plan is drawn the way the planner would:
+a uniform pick from the combination index window for their target, or the
+live search where the index cannot answer. Repeating this over several
+replicates gives the expected daily demand per item and an interval for it.
+"""
+import random
+import time
+
+import numpy as np
+
+from app.services.combination_search import SearchBudget, search_combination
+from app.services.meal_catalog import get_catalog, group_key
+from app.services.meal_generator import (
+    CALORIE_DISTRIBUTION,
+    FOOD_MAX_ITEMS,
+    PLAN_SEARCH_BUDGET,
+    STANDARD_DAILY_TARGETS,
+    period_targets,
+    plan_index,
+)
+from app.services.user_nutrition import (
+    CALORIE_STEP,
+    MIN_CALORIES,
+    calories_required_array,
+)
+
+NUMERIC_FIELDS = ("age", "height_in", "weight_lb")
+CATEGORY_FIELDS = (
+    "gender",
+    "activity_level",
+    "goal",
+    "breakfast_location",
+    "lunch_location",
+    "dinner_location",
+)
+
+# Used for any field the population does not describe. Numbers are a
+# clipped normal {"mean", "sd", "min", "max"} (or a constant); categories
+# map each value to its share (or are a constant). An empty location
+# means "any location".
+DEFAULT_POPULATION = {
+    "age": {"mean": 20, "sd": 2, "min": 17, "max": 30},
+    "height_in": {"mean": 67, "sd": 4, "min": 58, "max": 80},
+    "weight_lb": {"mean": 160, "sd": 30, "min": 95, "max": 300},
+    "gender": {"male": 0.5, "female": 0.5},
+    "activity_level": {"sedentary": 0.3, "moderate": 0.5, "active": 0.2},
+    "goal": {"maintain": 0.6, "lose": 0.25, "gain": 0.15},
+    "breakfast_location": "",
+    "lunch_location": "",
+    "dinner_location": "",
+}
+
+DEFAULT_REPLICATES = 20
+MAX_REPLICATES = 200
+DEFAULT_CONFIDENCE = 0.95
+MAX_FORECAST_POPULATION = 1_000_000
+
+# People per group and replicate who get a real live search when the
+# index cannot answer; their picks are scaled up to the whole group
+LIVE_SEARCH_SAMPLES = 32
+
+FOOD, DRINK = 1, 2  # positions in period_targets()
+
+
+def forecast_demand(
+    population=None,
+    size=10_000,
+    replicates=DEFAULT_REPLICATES,
+    confidence=DEFAULT_CONFIDENCE,
+    seed=None,
+    db_path=None,
+):
+    """
+    Simulates `replicates` days of `size` people described by `population`
+    (see DEFAULT_POPULATION) each generating a single-day plan, and returns
+    the expected portions per item and location with a `confidence`
+    interval across replicates. The same `seed` repeats the forecast for
+    the same library. Raises ValueError for an invalid population.
+    """
+    started = time.perf_counter()
+    population = {**DEFAULT_POPULATION, **(population or {})}
+    unknown = set(population) - set(NUMERIC_FIELDS) - set(CATEGORY_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown population fields: {', '.join(sorted(unknown))}")
+    size, replicates, confidence = int(size), int(replicates), float(confidence)
+    if not 1 <= size <= MAX_FORECAST_POPULATION:
+        raise ValueError(f"size must be between 1 and {MAX_FORECAST_POPULATION}")
+    if not 1 <= replicates <= MAX_REPLICATES:
+        raise ValueError(f"replicates must be between 1 and {MAX_REPLICATES}")
+    if not 0 < confidence < 1:
+        raise ValueError("confidence must be between 0 and 1")
+
+    if seed is None:
+        seed = random.randrange(2**32)
+    rng = np.random.default_rng(seed)
+    simulation = _Simulation(get_catalog(db_path).snapshot(), rng)
+
+    tallies = []
+    calories = 0.0
+    for _ in range(replicates):
+        people = sample_population(population, size, rng)
+        daily = calories_required_array(
+            people["age"],
+            people["height_in"],
+            people["weight_lb"],
+            people["gender"],
+            people["activity_level"],
+            people["goal"],
+        )
+        calories += daily.mean()
+        tallies.append(simulation.run(people, daily))
+
+    demand = np.zeros((replicates, len(simulation.keys)))
+    for r, tally in enumerate(tallies):
+        demand[r, : len(tally)] = tally
+
+    tail = (1 - confidence) / 2 * 100
+    expected = demand.mean(axis=0)
+    lower, upper = np.percentile(demand, [tail, 100 - tail], axis=0)
+
+    items = []
+    for (location, meal_type, name), k in simulation.keys.items():
+        if upper[k] == 0:
+            continue
+        item = {
+            "location": location,
+            "meal_type": meal_type,
+            "name": name,
+            "expected": round(float(expected[k]), 1),
+            "lower": round(float(lower[k]), 1),
+            "upper": round(float(upper[k]), 1),
+        }
+        if k in simulation.fallbacks:
+            item["fallback"] = True
+        items.append(item)
+    items.sort(key=lambda i: (i["location"], i["meal_type"], -i["expected"]))
+
+    return {
+        "size": size,
+        "replicates": replicates,
+        "confidence": confidence,
+        "seed": seed,
+        "mean_daily_calories": round(calories / replicates, 1),
+        "items": items,
+        "sampled_groups": sorted(
+            f"{meal_type} @ {location or 'any'}"
+            for location, meal_type in simulation.sampled_groups
+        ),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def sample_population(population, size, rng):
+    """Draws `size` people as a dict of field -> numpy array."""
+    people = {}
+    for field in NUMERIC_FIELDS:
+        people[field] = _sample_numeric(field, population[field], size, rng)
+    for field in CATEGORY_FIELDS:
+        people[field] = _sample_category(field, population[field], size, rng)
+    return people
+
+
+def _sample_numeric(field, spec, size, rng):
+    if isinstance(spec, (int, float)):
+        return np.full(size, float(spec))
+    if not isinstance(spec, dict) or "mean" not in spec:
+        raise ValueError(f"{field} must be a number or a {{mean, sd, min, max}} object")
+
+    values = rng.normal(float(spec["mean"]), float(spec.get("sd", 0)), size)
+    return np.clip(values, spec.get("min"), spec.get("max"))
+
+
+def _sample_category(field, spec, size, rng):
+    if spec is None or isinstance(spec, str):
+        return np.full(size, spec or "")
+    if not isinstance(spec, dict) or not spec:
+        raise ValueError(f"{field} must be a value or a {{value: share}} object")
+
+    shares = np.array([float(s) for s in spec.values()])
+    if (shares < 0).any() or shares.sum() <= 0:
+        raise ValueError(f"{field} shares must be positive")
+    values = np.array([v or "" for v in spec])
+    return values[rng.choice(len(values), size, p=shares / shares.sum())]
+
+
+class _Simulation:
+    """
+    Draws plans for one catalog snapshot. Demand is tallied per
+    (location, meal_type, name) key, numbered in `keys`.
+    """
+
+    def __init__(self, catalog, rng):
+        self.catalog = catalog
+        self.index_set = plan_index(catalog, wait=True)
+        self.rng = rng
+        self.search_rng = random.Random(int(rng.integers(2**63)))
+        self.keys = {}
+        self.fallbacks = set()
+        self.sampled_groups = set()
+        self._item_keys = {}
+        self._windows = {}
+        self._ids = []
+        self._weights = []
+
+    def run(self, people, daily):
+        """Returns one day's portions per key for a sampled population."""
+        self._ids = []
+        self._weights = []
+        targets = (daily - MIN_CALORIES) // CALORIE_STEP
+
+        for meal_type, fraction in CALORIE_DISTRIBUTION.items():
+            locations = people[f"{meal_type}_location"]
+            for location in np.unique(locations):
+                served = targets[locations == location]
+                location = str(location) or None
+                self._serve(meal_type, location, fraction, FOOD, served)
+                self._serve("drink", location, fraction, DRINK, served)
+
+        ids = np.concatenate(self._ids)
+        weights = np.concatenate(self._weights)
+        return np.bincount(ids, weights=weights, minlength=len(self.keys))
+
+    def _serve(self, meal_type, location, fraction, part, served):
+        key = group_key(meal_type, location)
+        group = self.catalog.get(meal_type, location)
+        if not len(group):
+            # The planner serves a placeholder instead
+            name = "Water" if part == DRINK else f"{meal_type.title()} Special"
+            k = self._key(location or "Any", key[1], name)
+            self.fallbacks.add(k)
+            self._tally(np.array([k]), float(len(served)))
+            return
+
+        width = FOOD_MAX_ITEMS if part == FOOD else 1
+        item_keys = self._keys_for(key, group)
+        index = self.index_set.get(meal_type, location)
+        if index is not None and index.width == width:
+            lo, hi = self._windows_for(key, index, fraction, part)
+            lo, hi = lo[served], hi[served]
+            hit = hi > lo
+            # Same uniform draw from the window as CombinationIndex.choose
+            picks = lo[hit] + (self.rng.random(hit.sum()) * (hi - lo)[hit]).astype(
+                np.int64
+            )
+            offsets = np.frombuffer(index.offsets, dtype=index.offsets.typecode)
+            rows = offsets.reshape(-1, width)[picks].ravel()
+            self._tally(item_keys[rows[rows != index.size]], 1.0)
+            served = served[~hit]
+
+        if len(served):
+            self._search(key, group, item_keys, fraction, part, width, served)
+
+    def _search(self, key, group, item_keys, fraction, part, width, served):
+        sample = served
+        if len(served) > LIVE_SEARCH_SAMPLES:
+            sample = self.rng.choice(served, LIVE_SEARCH_SAMPLES, replace=False)
+            self.sampled_groups.add(key)
+        scale = len(served) / len(sample)
+
+        for t in sample:
+            target = period_targets(STANDARD_DAILY_TARGETS[t], fraction)[part]
+            found = search_combination(
+                group.calories,
+                target,
+                width,
+                rng=self.search_rng,
+                budget=SearchBudget(PLAN_SEARCH_BUDGET),
+            )
+            self._tally(item_keys[found], scale)
+
+    def _windows_for(self, key, index, fraction, part):
+        # (lo, hi) index windows for every daily target, as arrays
+        windows = self._windows.get((key, fraction, part))
+        if windows is None:
+            bounds = [
+                index.window(period_targets(daily, fraction)[part]) or (0, 0)
+                for daily in STANDARD_DAILY_TARGETS
+            ]
+            windows = self._windows[(key, fraction, part)] = np.array(bounds).T
+        return windows
+
+    def _keys_for(self, key, group):
+        # Key number of every item in a group, in group order
+        item_keys = self._item_keys.get(key)
+        if item_keys is None:
+            item_keys = self._item_keys[key] = np.array(
+                [
+                    self._key(location or "Any", key[1], name)
+                    for name, location in zip(group.names, group.locations)
+                ],
+                dtype=np.int64,
+            )
+        return item_keys
+
+    def _key(self, location, meal_type, name):
+        return self.keys.setdefault((location, meal_type, name), len(self.keys))
+
+    def _tally(self, ids, weight):
+        self._ids.append(ids)
+        self._weights.append(np.full(len(ids), weight))
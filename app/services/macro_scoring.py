@@ -0,0 +1,122 @@
+# app/services/macro_scoring.py
+import random
+
+import numpy as np
+
+from app.metrics import COMBINATIONS_EVALUATED
+
+# Column order of the per-group item matrices
+MACRO_COLUMNS = ("calories", "carbs", "fat", "protein")
+CALORIES_PER_GRAM = {"carbs": 4, "fat": 9, "protein": 4}
+DEFAULT_WEIGHTS = {"calories": 1.0, "carbs": 1.0, "fat": 1.0, "protein": 1.0}
+
+# The pick is drawn from this many best-scoring combinations for variety
+SHORTLIST_SIZE = 5
+
+# In-range combinations drawn by the live search for scoring, for groups
+# the combination index does not cover
+SEARCH_SAMPLE_SIZE = 64
+
+
+def build_item_matrices(groups):
+    """
+    Holds every catalog group as an (n + 1) x 4 float matrix in
+    MACRO_COLUMNS order. The last row is all zeros so padded index rows
+    sum correctly.
+    """
+    matrices = {}
+    for key, meals in groups.items():
+        matrix = np.zeros((len(meals) + 1, len(MACRO_COLUMNS)))
+        for col, column in enumerate(MACRO_COLUMNS):
+            matrix[:-1, col] = np.asarray(getattr(meals, column))
+        matrices[key] = matrix
+    return matrices
+
+
+def macro_targets_from_ratios(total_calories, ratios):
+    """Converts calorie ratios, e.g. {"protein": 0.3}, into daily grams."""
+    return {
+        macro: total_calories * float(ratio) / CALORIES_PER_GRAM[macro]
+        for macro, ratio in ratios.items()
+    }
+
+
+def choose_by_macros(
+    matrix,
+    index,
+    calorie_target,
+    macro_target,
+    weights=None,
+    tolerance=0.1,
+    rng=None,
+    exclude=None,
+):
+    """
+    Scores every combination within calorie tolerance on a weighted
+    relative distance across calories, carbs, fat and protein, in one
+    batch of array operations over the index slice.
+
+    Returns the offsets of a combination drawn from the best few, or None
+    when the index has no in-range combination to score.
+    """
+    window = index.window(calorie_target, tolerance)
+    if window is None or window[0] == window[1]:
+        return None
+
+    offsets = np.frombuffer(index.offsets, dtype=index.offsets.typecode)
+    rows = offsets.reshape(-1, index.width)[window[0] : window[1]]
+    if exclude:
+        rows = rows[~np.isin(rows, list(exclude)).any(axis=1)]
+        if len(rows) == 0:
+            return None
+    picked = _choose_best(matrix, rows, calorie_target, macro_target, weights, rng)
+    return [int(i) for i in picked if i != index.size]
+
+
+def choose_by_macros_among(
+    matrix, combinations, calorie_target, macro_target, weights=None, rng=None
+):
+    """
+    Like choose_by_macros, but scores the given combinations (lists of
+    group offsets, e.g. drawn by sample_combinations) instead of an index
+    window. Returns None if there are none.
+    """
+    if not combinations:
+        return None
+    # Pad shorter combinations with the all-zero last row
+    pad = len(matrix) - 1
+    width = max(len(c) for c in combinations)
+    rows = np.unique(
+        np.array([list(c) + [pad] * (width - len(c)) for c in combinations]), axis=0
+    )
+    picked = _choose_best(matrix, rows, calorie_target, macro_target, weights, rng)
+    return [int(i) for i in picked if i != pad]
+
+
+def _choose_best(matrix, rows, calorie_target, macro_target, weights, rng):
+    # Scores the rows (offset lists into `matrix`) and draws from the best few
+    COMBINATIONS_EVALUATED.inc("macro", amount=len(rows))
+
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    goal = np.array(
+        [
+            calorie_target if c == "calories" else macro_target.get(c, 0.0)
+            for c in MACRO_COLUMNS
+        ]
+    )
+    # Dimensions without a target are left out of the score
+    w = np.array(
+        [
+            float(weights[c]) if c == "calories" or c in macro_target else 0.0
+            for c in MACRO_COLUMNS
+        ]
+    )
+
+    totals = matrix[rows].sum(axis=1)
+    scores = ((totals - goal) / np.maximum(goal, 1.0)) ** 2 @ w
+
+    if len(scores) > SHORTLIST_SIZE:
+        shortlist = np.argpartition(scores, SHORTLIST_SIZE - 1)[:SHORTLIST_SIZE]
+    else:
+        shortlist = np.arange(len(scores))
+    return rows[shortlist[(rng or random).randrange(len(shortlist))]]
@@ -0,0 +1,266 @@
+# app/services/meal_catalog.py
+import logging
+import os
+import sys
+import threading
+from array import array
+
+from app import db
+from app.services import catalog_file
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_key(value):
+    """Normalizes a location or meal type the way the generator compares them."""
+    return (value or "").strip().lower()
+
+
+def group_key(meal_type, location=None):
+    """Key of a catalog group; a missing location means every location."""
+    return (normalize_key(location) or None, normalize_key(meal_type))
+
+
+class MealGroup:
+    """
+    The calorie-sorted meals of one catalog group, stored column-wise.
+
+    Calories and macros are `array('d')` columns (or float64 views into a
+    mapped snapshot file) and names/locations are interned strings, so a
+    group costs a few dozen bytes per item instead of a dict each.
+    Searches work on offsets into the columns; indexing a group builds the
+    meal dict for just that item.
+    """
+
+    __slots__ = ("names", "locations", "calories", "carbs", "fat", "protein")
+
+    def __init__(self):
+        self.names = []
+        self.locations = []
+        self.calories = array("d")
+        self.carbs = array("d")
+        self.fat = array("d")
+        self.protein = array("d")
+
+    def __len__(self):
+        return len(self.calories)
+
+    def __getitem__(self, i):
+        return {
+            "name": self.names[i],
+            "calories": self.calories[i],
+            "carbs": self.carbs[i],
+            "fat": self.fat[i],
+            "protein": self.protein[i],
+            "location": self.locations[i],
+        }
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    @classmethod
+    def from_columns(cls, names, locations, calories, carbs, fat, protein):
+        """Wraps existing columns (e.g. views into a mapped snapshot file)."""
+        group = cls.__new__(cls)
+        group.names = names
+        group.locations = locations
+        group.calories = calories
+        group.carbs = carbs
+        group.fat = fat
+        group.protein = protein
+        return group
+
+    def append(self, name, calories, carbs, fat, protein, location):
+        self.names.append(sys.intern(name))
+        self.locations.append(sys.intern(location) if location else location)
+        self.calories.append(calories)
+        self.carbs.append(carbs)
+        self.fat.append(fat)
+        self.protein.append(protein)
+
+    @classmethod
+    def merged(cls, groups):
+        """Concatenates `groups` into a new group, stably sorted by calories."""
+        merged = cls()
+        for group in groups:
+            merged.names += group.names
+            merged.locations += group.locations
+            merged.calories += group.calories
+            merged.carbs += group.carbs
+            merged.fat += group.fat
+            merged.protein += group.protein
+
+        order = sorted(range(len(merged)), key=merged.calories.__getitem__)
+        result = cls()
+        result.names = [merged.names[i] for i in order]
+        result.locations = [merged.locations[i] for i in order]
+        for column in ("calories", "carbs", "fat", "protein"):
+            values = getattr(merged, column)
+            setattr(result, column, array("d", (values[i] for i in order)))
+        return result
+
+
+# Returned for groups with no meals; never mutated
+EMPTY_GROUP = MealGroup()
+
+
+class CatalogSnapshot:
+    """
+    One loaded version of the meal library, plus data derived from it.
+    `fingerprint` is a digest of the contents, the same in every process
+    and across restarts; `stamp` identifies the database state it came from.
+    """
+
+    def __init__(self, version, groups, stamp=None, fingerprint=None):
+        self.version = version
+        self.groups = groups
+        self.stamp = stamp
+        self.fingerprint = fingerprint
+        self._derived = {}
+        self._lock = threading.Lock()
+
+    def get(self, meal_type, location=None):
+        """
+        Returns the calorie-sorted MealGroup of `meal_type` at `location`.
+        A missing location returns that meal type across every location.
+        """
+        return self.groups.get(group_key(meal_type, location), EMPTY_GROUP)
+
+    def derived(self, name, builder):
+        """Returns `builder(groups)`, computed once for this snapshot."""
+        value = self._derived.get(name)
+        if value is None:
+            with self._lock:
+                value = self._derived.get(name)
+                if value is None:
+                    value = self._derived[name] = builder(self.groups)
+        return value
+
+
+class MealCatalog:
+    """
+    Process-wide, read-only copy of the `meals` table.
+
+    Meals are grouped by (normalized location, meal_type) and sorted by
+    calories. The groups are kept in a binary snapshot file next to the
+    database (see catalog_file), memory-mapped so every worker process
+    shares one copy in the page cache.
+
+    Each read compares the database's file stamp with the snapshot's, so
+    a write from any process is noticed. Writers in this process also call
+    `invalidate()` after committing, which bumps `version`. On a change the
+    snapshot file is re-mapped if another process already rewrote it, or
+    rebuilt from SQLite and rewritten otherwise.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.snapshot_path = catalog_file.snapshot_path(db_path)
+        self.version = 0
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Marks the catalog stale so the next read reloads it."""
+        with self._lock:
+            self.version += 1
+
+    def snapshot(self):
+        """Returns the current snapshot, reloading it if the library changed."""
+        snapshot = self._snapshot
+        stamp = catalog_file.library_stamp(self.db_path)
+        if self._is_current(snapshot, stamp):
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            stamp = catalog_file.library_stamp(self.db_path)
+            if not self._is_current(snapshot, stamp):
+                if snapshot is not None and snapshot.version == self.version:
+                    self.version += 1  # changed by another process
+                snapshot = self._snapshot = self._open(stamp)
+        return snapshot
+
+    def _is_current(self, snapshot, stamp):
+        return (
+            snapshot is not None
+            and snapshot.version == self.version
+            and snapshot.stamp == stamp
+        )
+
+    def _open(self, stamp):
+        mapped = catalog_file.read(self.snapshot_path, MealGroup.from_columns)
+        if mapped is not None and mapped[0] == stamp:
+            return CatalogSnapshot(self.version, mapped[2], stamp, mapped[1])
+
+        # Stamped before reading, so a write racing the load is caught next time
+        groups = self._load()
+        try:
+            fingerprint = catalog_file.write(self.snapshot_path, groups, stamp)
+        except OSError:
+            logger.exception("Could not write catalog snapshot; serving from memory")
+            _, fingerprint = catalog_file.serialize(groups, stamp)
+            return CatalogSnapshot(self.version, groups, stamp, fingerprint)
+
+        # Serve from the mapping as well, sharing the page cache copy
+        mapped = catalog_file.read(self.snapshot_path, MealGroup.from_columns)
+        if mapped is not None and mapped[1] == fingerprint:
+            groups = mapped[2]
+        return CatalogSnapshot(self.version, groups, stamp, fingerprint)
+
+    def get(self, meal_type, location=None):
+        """Shortcut for `snapshot().get(...)`."""
+        return self.snapshot().get(meal_type, location)
+
+    def _load(self):
+        groups = {}
+        with db.connection(self.db_path) as conn:
+            # Walks idx_meals_type_location_calories, so groups arrive sorted
+            # (meals without a location first). Ties are broken by id so
+            # seeded plans repeat across reloads. Rows are streamed straight
+            # into the columns rather than fetched into a list first.
+            rows = conn.execute(
+                """
+                SELECT name, calories, carbohydrates, fat, protein, location,
+                       meal_type_key, location_key
+                FROM meals
+                ORDER BY meal_type_key, location_key, calories, id
+                """
+            )
+            for r in rows:
+                key = (r[7] or None, r[6] or "")
+                group = groups.get(key)
+                if group is None:
+                    group = groups[key] = MealGroup()
+                group.append(
+                    r[0], float(r[1]), float(r[2]), float(r[3]), float(r[4]), r[5]
+                )
+
+        # Requests without a location draw from every location of the type
+        by_type = {}
+        for (location, meal_type), group in groups.items():
+            by_type.setdefault(meal_type, []).append(group)
+        for meal_type, type_groups in by_type.items():
+            groups[(None, meal_type)] = MealGroup.merged(type_groups)
+        return groups
+
+
+# --- Shared instances ---
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(db_path=None):
+    """Returns the shared catalog for a database (the main library by default)."""
+    db_path = os.path.abspath(db_path or db.get_db_path())
+    catalog = _catalogs.get(db_path)
+    if catalog is None:
+        with _catalogs_lock:
+            catalog = _catalogs.setdefault(db_path, MealCatalog(db_path))
+    return catalog
+
+
+def invalidate_catalog(db_path=None):
+    """Bumps the catalog version after the meal library has been written."""
+    get_catalog(db_path).invalidate()
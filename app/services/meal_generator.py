@@ -1,12 +1,56 @@
 # app/services/meal_generator.py
-import sqlite3
-import os
-import itertools
-import random
+import logging
+import threading
+import time
+from array import array
+
+from app.metrics import FALLBACK_ITEMS, PLAN_STAGE_SECONDS
+from app.services.combination_index import build_index_set
+from app.services.combination_search import (
+    SearchBudget,
+    sample_combinations,
+    search_combination,
+)
+from app.services.macro_scoring import (
+    SEARCH_SAMPLE_SIZE,
+    build_item_matrices,
+    choose_by_macros,
+    choose_by_macros_among,
+)
+from app.services.meal_catalog import MealGroup, get_catalog, group_key
+from app.services.user_nutrition import CALORIE_STEP, MAX_CALORIES, MIN_CALORIES
+
+logger = logging.getLogger(__name__)
 
 BREAKFAST_PERCENT = 0.25
 LUNCH_PERCENT = 0.35
 DINNER_PERCENT = 0.4
+DRINK_PERCENT = 0.2
+
+# Food items per meal: the default is served from the combination index,
+# larger plates by a time-budgeted live search
+FOOD_MAX_ITEMS = 3
+MAX_FOOD_ITEMS = 6
+
+# Wall-clock seconds one plan request may spend in live searches
+PLAN_SEARCH_BUDGET = 0.25
+
+# Multi-day plans: longest plan and default per-item repeat limit
+MAX_PLAN_DAYS = 31
+DEFAULT_MAX_REPEATS = 2
+
+CALORIE_DISTRIBUTION = {
+    "breakfast": BREAKFAST_PERCENT,
+    "lunch": LUNCH_PERCENT,
+    "dinner": DINNER_PERCENT,
+}
+
+# Every daily target calories_required can return
+STANDARD_DAILY_TARGETS = range(MIN_CALORIES, MAX_CALORIES + 1, CALORIE_STEP)
+
+# Most recently completed IndexSet; the next build reuses its indexes for
+# groups whose calories did not change
+_last_index_set = None
 
 
 def generate_meal_plan(
@@ -15,61 +59,249 @@ def generate_meal_plan(
     lunch_location=None,
     dinner_location=None,
     db_path=None,
+    macro_targets=None,
+    macro_weights=None,
+    rng=None,
+    max_items=FOOD_MAX_ITEMS,
+    search_budget=PLAN_SEARCH_BUDGET,
 ):
-    """Generates a meal plan based upon user location"""
-    calorie_distribution = {
-        "breakfast": BREAKFAST_PERCENT,
-        "lunch": LUNCH_PERCENT,
-        "dinner": DINNER_PERCENT,
+    """
+    Generates a meal plan based upon user location.
+    With `macro_targets` (daily grams of protein/carbs/fat), food is also
+    scored on macros; `macro_weights` adjusts how each dimension counts.
+    Each period reports `macros_applied: false` if it had no in-range
+    combination to score.
+    Passing a seeded `random.Random` as `rng` makes the plan reproducible
+    for the same library once its combination index is built (see
+    plan_index_ready).
+    Meals hold up to `max_items` food items (at most MAX_FOOD_ITEMS). Live
+    searches share `search_budget` seconds; if it runs out the best
+    combinations found are served and the plan is marked `exact: false`.
+    """
+    _check_max_items(max_items)
+
+    # Shared in-memory catalog, only reloaded after the library changes
+    started = time.perf_counter()
+    catalog = get_catalog(db_path).snapshot()
+    PLAN_STAGE_SECONDS.observe(time.perf_counter() - started, "catalog")
+    tables = _plan_tables(catalog, macro_targets)
+
+    # The search budget only covers searching, not loading or indexing
+    budget = SearchBudget(search_budget)
+
+    # Location mapping per meal type
+    location_map = {
+        "breakfast": breakfast_location,
+        "lunch": lunch_location,
+        "dinner": dinner_location,
     }
 
-    # Resolve DB path
-    if db_path is None:
-        db_path = os.path.join(
-            os.path.dirname(__file__), "..", "..", "meal-library", "meal_library.db"
-        )
+    return _plan_day(
+        catalog,
+        tables,
+        total_calories,
+        location_map,
+        macro_targets=macro_targets,
+        macro_weights=macro_weights,
+        rng=rng,
+        max_items=max_items,
+        budget=budget,
+    )
 
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
 
-    plan = {}
+def generate_multi_day_plan(
+    total_calories,
+    days,
+    breakfast_location=None,
+    lunch_location=None,
+    dinner_location=None,
+    max_repeats=DEFAULT_MAX_REPEATS,
+    db_path=None,
+    macro_targets=None,
+    macro_weights=None,
+    rng=None,
+    max_items=FOOD_MAX_ITEMS,
+    search_budget=PLAN_SEARCH_BUDGET,
+):
+    """
+    Generates `days` daily plans in one pass over a single catalog load.
+    Each food item is served at most `max_repeats` times across all days
+    (None for no limit); drinks may repeat freely. `search_budget` covers
+    all days together.
+    """
+    if not 1 <= days <= MAX_PLAN_DAYS:
+        raise ValueError(f"days must be between 1 and {MAX_PLAN_DAYS}")
+    if max_repeats is not None and max_repeats < 1:
+        raise ValueError("max_repeats must be at least 1 (or null for no limit)")
+    _check_max_items(max_items)
+
+    started = time.perf_counter()
+    catalog = get_catalog(db_path).snapshot()
+    PLAN_STAGE_SECONDS.observe(time.perf_counter() - started, "catalog")
+    tables = _plan_tables(catalog, macro_targets)
+    budget = SearchBudget(search_budget)
 
-    # Location mapping per meal type
     location_map = {
         "breakfast": breakfast_location,
         "lunch": lunch_location,
         "dinner": dinner_location,
     }
+    tracker = RepeatTracker(catalog, location_map, max_repeats)
+
+    day_plans = [
+        _plan_day(
+            catalog,
+            tables,
+            total_calories,
+            location_map,
+            tracker,
+            macro_targets,
+            macro_weights,
+            rng,
+            max_items,
+            budget,
+        )
+        for _ in range(days)
+    ]
+
+    total_target = total_calories * days
+    total_selected = sum(d["total_selected_calories"] for d in day_plans)
+
+    return {
+        "days": days,
+        "max_repeats": max_repeats,
+        "total_target_calories": round(total_target, 1),
+        "total_selected_calories": round(total_selected, 1),
+        "match_percent": (
+            round((total_selected / total_target) * 100, 1) if total_target else 0
+        ),
+        "exact": budget.exact,
+        "plans": day_plans,
+    }
+
 
-    for meal_type, fraction in calorie_distribution.items():
+def _check_max_items(max_items):
+    if not 1 <= max_items <= MAX_FOOD_ITEMS:
+        raise ValueError(f"max_items must be between 1 and {MAX_FOOD_ITEMS}")
+
+
+def _plan_tables(catalog, macro_targets=None):
+    # Index (and macro matrices) of a snapshot, built on first use
+    started = time.perf_counter()
+    index_set = plan_index(catalog)
+    matrices = None
+    if macro_targets:
+        matrices = catalog.derived("item_matrices", build_item_matrices)
+    PLAN_STAGE_SECONDS.observe(time.perf_counter() - started, "index")
+    return index_set, matrices
+
+
+def _plan_day(
+    catalog,
+    tables,
+    total_calories,
+    location_map,
+    tracker=None,
+    macro_targets=None,
+    macro_weights=None,
+    rng=None,
+    max_items=FOOD_MAX_ITEMS,
+    budget=None,
+):
+    index_set, matrices = tables
+    plan = {}
+    food_seconds = drink_seconds = 0.0
+
+    for meal_type, fraction in CALORIE_DISTRIBUTION.items():
         loc = location_map[meal_type]
 
         # Fetch meals and drinks specific to this location
-        meals = fetch_all(cursor, meal_type, loc)
-        drinks = fetch_all(cursor, "drink", loc)
+        meals = catalog.get(meal_type, loc)
+        drinks = catalog.get("drink", loc)
 
-        target_cal = total_calories * fraction
-        drink_percent = 0.2
-        food_target = target_cal * (1 - drink_percent)
-        drink_target = target_cal * drink_percent
+        target_cal, food_target, drink_target = period_targets(
+            total_calories, fraction
+        )
 
-        # Pick best food combo
-        meal_combo = choose_best_combination(meals, food_target)
+        # Pick best food combo, skipping items that hit their repeat limit
+        started = time.perf_counter()
+        index = index_set.get(meal_type, loc)
+        picked = None
+        period_macros = None
+        if macro_targets:
+            period_macros = {
+                macro: grams * fraction * (1 - DRINK_PERCENT)
+                for macro, grams in macro_targets.items()
+            }
+        if period_macros and index is not None and index.width == max_items:
+            picked = choose_by_macros(
+                matrices[group_key(meal_type, loc)],
+                index,
+                food_target,
+                period_macros,
+                macro_weights,
+                rng=rng,
+                exclude=tracker.exhausted[meal_type] if tracker else None,
+            )
+        elif period_macros and meals:
+            # No index for this group or plate size: score a sample of
+            # in-range combinations from the live search instead
+            offsets, calories = (
+                tracker.available[meal_type] if tracker else (None, meals.calories)
+            )
+            found = sample_combinations(
+                calories,
+                food_target,
+                SEARCH_SAMPLE_SIZE,
+                max_items,
+                rng=rng,
+                budget=budget,
+            )
+            if offsets is not None:
+                found = [[offsets[i] for i in combo] for combo in found]
+            picked = choose_by_macros_among(
+                matrices[group_key(meal_type, loc)],
+                found,
+                food_target,
+                period_macros,
+                macro_weights,
+                rng=rng,
+            )
+
+        if picked is not None:
+            if tracker is not None:
+                tracker.record(meal_type, picked)
+            meal_combo = [meals[i] for i in picked]
+        elif tracker is None:
+            meal_combo = choose_indexed_combination(
+                index, meals, food_target, max_items, rng=rng, budget=budget
+            )
+        else:
+            meal_combo = tracker.choose(
+                meal_type, index, food_target, rng, max_items, budget
+            )
+        food_seconds += time.perf_counter() - started
 
         # Pick best drink — or fallback to Water if none available
+        started = time.perf_counter()
         if drinks:
-            drink_choice = choose_best_combination(drinks, drink_target, max_items=1)
+            drink_choice = choose_indexed_combination(
+                index_set.get("drink", loc), drinks, drink_target, max_items=1, rng=rng
+            )
         else:
-            drink_choice = [fallback_item("Water", 0, loc)]
+            drink_choice = None
+        drink_seconds += time.perf_counter() - started
 
         # Fallbacks for missing food
         if not meal_combo:
+            FALLBACK_ITEMS.inc("food")
             meal_combo = [
                 fallback_item(f"{meal_type.title()} Special", food_target, loc)
             ]
 
         # Fallback for missing drink option will be water
         if not drink_choice:
+            FALLBACK_ITEMS.inc("drink")
             drink_choice = [fallback_item("Water", 0, loc)]
 
         total_meal_cal = round(
@@ -86,8 +318,16 @@ def generate_meal_plan(
             "target_meal_period_calories": round(target_cal, 1),
             "total_meal_period_calories": total_meal_cal,
         }
+        if period_macros:
+            plan[meal_type]["target_food_macros"] = {
+                macro: round(grams, 1) for macro, grams in period_macros.items()
+            }
+            # False when there was nothing to score and food was picked on
+            # calories alone
+            plan[meal_type]["macros_applied"] = picked is not None
 
-    conn.close()
+    PLAN_STAGE_SECONDS.observe(food_seconds, "food_search")
+    PLAN_STAGE_SECONDS.observe(drink_seconds, "drink_search")
 
     total_selected = sum(p["total_meal_period_calories"] for p in plan.values())
 
@@ -97,67 +337,233 @@ def generate_meal_plan(
         "match_percent": (
             round((total_selected / total_calories) * 100, 1) if total_calories else 0
         ),
+        "exact": budget.exact if budget is not None else True,
         "plan": plan,
     }
 
 
-# --- Combination Search ---
-def choose_best_combination(meals, target, max_items=3, tolerance=0.1):
+class RepeatTracker:
     """
-    Selects up to `max_items` meals whose total calories are within
-    `tolerance` (e.g. 0.1 = ±10%) of the target.
-    If multiple fit, picks one at random for variety.
+    Counts how often each food item has been served in a multi-day plan.
+
+    Once an item reaches `max_repeats` it is dropped from that period's
+    candidate list, so later days search only what is still available
+    instead of re-filtering the whole group each time.
     """
-    if not meals:
-        return None
 
-    meals = sorted(meals, key=lambda m: m["calories"])
+    def __init__(self, catalog, location_map, max_repeats):
+        self.max_repeats = max_repeats
+        self.meals = {}
+        self.counts = {}
+        self.exhausted = {}
+        self.available = {}
+        for meal_type, loc in location_map.items():
+            meals = catalog.get(meal_type, loc)
+            self.meals[meal_type] = meals
+            self.counts[meal_type] = [0] * len(meals)
+            self.exhausted[meal_type] = set()
+            # Offsets still allowed, with their calories, in sorted order
+            self.available[meal_type] = (
+                list(range(len(meals))),
+                array("d", meals.calories),
+            )
+
+    def choose(
+        self, meal_type, index, target, rng=None, max_items=FOOD_MAX_ITEMS, budget=None
+    ):
+        """Picks a food combination for one period and records its use."""
+        meals = self.meals[meal_type]
+        exhausted = self.exhausted[meal_type]
+
+        # Rejection sampling from the index only pays off while most items
+        # are still available
+        picked = None
+        if (
+            index is not None
+            and index.width == max_items
+            and len(exhausted) * 2 <= len(meals)
+        ):
+            picked = index.choose(target, rng=rng, exclude=exhausted)
+        if picked is None:
+            offsets, calories = self.available[meal_type]
+            found = search_combination(
+                calories, target, max_items, rng=rng, budget=budget
+            )
+            picked = [offsets[i] for i in found] if found else None
+        if not picked:
+            return None
+
+        self.record(meal_type, picked)
+        return [meals[i] for i in picked]
+
+    def record(self, meal_type, picked):
+        """Counts one serving of each offset in `picked`."""
+        counts = self.counts[meal_type]
+        for i in picked:
+            counts[i] += 1
+            if self.max_repeats is None or counts[i] < self.max_repeats:
+                continue
+
+            self.exhausted[meal_type].add(i)
+            offsets, calories = self.available[meal_type]
+            pos = offsets.index(i)
+            del offsets[pos]
+            del calories[pos]
+
+
+def period_targets(total_calories, fraction):
+    """Splits a meal period's calories into (period, food, drink) targets."""
+    target_cal = total_calories * fraction
+    return (
+        target_cal,
+        target_cal * (1 - DRINK_PERCENT),
+        target_cal * DRINK_PERCENT,
+    )
+
+
+def plan_index_stats(db_path=None):
+    """Reports build time and memory of the current combination index."""
+    catalog = get_catalog(db_path).snapshot()
+    index_set = plan_index(catalog, wait=True)
+    return dict(index_set.stats, library_version=catalog.version)
+
+
+def plan_index(catalog, wait=False):
+    """
+    Returns the combination IndexSet of a catalog snapshot.
 
-    combos_in_range = []
-    best_diff = float("inf")
-    best_combo = None
+    The first call for a snapshot starts building its index in a background
+    thread, reusing the previous index of every group whose calories did
+    not change. Until the build finishes, those reused indexes are returned
+    and other groups are served by the live search; with `wait`, the call
+    blocks for the finished set instead.
+    """
+    build = catalog.derived("combination_index", _IndexBuild)
+    return build.wait() if wait else build.current()
 
-    lower_bound = target * (1 - tolerance)
-    upper_bound = target * (1 + tolerance)
 
-    # Generate all possible meal combinations of meals.
-    # The meal combo itself can be a list of meal items between 1 and the max_items
-    for r in range(1, max_items + 1):
-        for combo in itertools.combinations(meals, r):
+def plan_index_ready(catalog):
+    """
+    True once a snapshot's full combination index is built. Plans drawn
+    before then may differ from later ones with the same seed.
+    """
+    return catalog.derived("combination_index", _IndexBuild).done.is_set()
+
+
+class _IndexBuild:
+    """Background build of one snapshot's IndexSet."""
+
+    def __init__(self, groups):
+        previous = _last_index_set
+        self.partial = _build_plan_index(groups, previous, partial=True)
+        self.result = None
+        self.done = threading.Event()
+        threading.Thread(
+            target=self._run,
+            args=(groups, previous),
+            name="plan-index",
+            daemon=True,
+        ).start()
+
+    def _run(self, groups, previous):
+        global _last_index_set
+        try:
+            self.result = _last_index_set = _build_plan_index(groups, previous)
+        except Exception:
+            logger.exception("Could not build the combination index")
+            self.result = self.partial
+        finally:
+            self.done.set()
+
+    def current(self):
+        return self.result or self.partial
+
+    def wait(self):
+        self.done.wait()
+        return self.result
+
+
+def _build_plan_index(groups, previous=None, partial=False):
+    # Index each meal period for every target the planner can ask for
+    plan = {}
+    drink_targets = set()
+    for meal_type, fraction in CALORIE_DISTRIBUTION.items():
+        food_targets = set()
+        for daily in STANDARD_DAILY_TARGETS:
+            _, food_target, drink_target = period_targets(daily, fraction)
+            food_targets.add(food_target)
+            drink_targets.add(drink_target)
+        plan[meal_type] = (food_targets, FOOD_MAX_ITEMS)
+    plan["drink"] = (drink_targets, 1)
+    return build_index_set(groups, plan, previous, partial)
+
+
+# --- Combination Search ---
+def choose_indexed_combination(
+    index, meals, target, max_items=3, tolerance=0.1, rng=None, budget=None
+):
+    """
+    Draws an in-range combination from the precomputed index when it can
+    answer, otherwise falls back to the live search.
+    `meals` must be the calorie-sorted group the index was built from.
+    """
+    if index is not None and index.width == max_items:
+        picked = index.choose(target, tolerance, rng)
+        if picked is not None:
+            return [meals[i] for i in picked]
+    return choose_best_combination(meals, target, max_items, tolerance, rng, budget)
 
-            # Check to see how close the combo is to the target
-            total_cal = sum(m["calories"] for m in combo)
-            diff = abs(total_cal - target)
 
-            # Collect all combos within tolerance range
-            if lower_bound <= total_cal <= upper_bound:
-                combos_in_range.append(combo)
+def choose_best_combination(
+    meals, target, max_items=3, tolerance=0.1, rng=None, budget=None
+):
+    """
+    Selects up to `max_items` meals whose total calories are within
+    `tolerance` (e.g. 0.1 = ±10%) of the target.
+    If multiple fit, picks one at random (from `rng`, if given) for variety.
+    If none fit, returns the closest combination instead.
+    `meals` is a catalog MealGroup (already sorted) or a list of meal dicts.
+    With a SearchBudget the search stops when it expires (see
+    search_combination).
+    """
+    if not meals:
+        return None
 
-            # Track the absolute best (fallback if no combos fit)
-            if diff < best_diff:
-                best_diff = diff
-                best_combo = combo
+    if isinstance(meals, MealGroup):
+        calories = meals.calories
+    else:
+        meals = sorted(meals, key=lambda m: m["calories"])
+        calories = [m["calories"] for m in meals]
 
-    # Prefer random variety within range, else fallback to best
-    if combos_in_range:
-        return list(random.choice(combos_in_range))
-    # If theres no combo in range, return the best one
-    return list(best_combo) if best_combo else None
+    picked = search_combination(calories, target, max_items, tolerance, rng, budget)
+    return [meals[i] for i in picked] if picked else None
 
 
 # --- DB & Fallback helpers ---
 
 
-def fetch_all(cursor, meal_type, location=None):
+def fetch_all(cursor, meal_type, location=None, min_calories=None, max_calories=None):
+    """
+    Fetches meals of a type (and location), sorted by calories.
+    Filters on the normalized key columns so the lookup is a range scan of
+    idx_meals_type_location_calories; the calorie bounds narrow the scan.
+    """
     query = """
         SELECT name, calories, carbohydrates, fat, protein, location
         FROM meals
-        WHERE LOWER(TRIM(meal_type)) = LOWER(TRIM(?))
+        WHERE meal_type_key = LOWER(TRIM(?))
     """
     params = [meal_type]
     if location:
-        query += " AND LOWER(TRIM(location)) = LOWER(TRIM(?))"
+        query += " AND location_key = LOWER(TRIM(?))"
         params.append(location)
+    if min_calories is not None:
+        query += " AND calories >= ?"
+        params.append(min_calories)
+    if max_calories is not None:
+        query += " AND calories <= ?"
+        params.append(max_calories)
+    query += " ORDER BY calories"
 
     cursor.execute(query, params)
     results = cursor.fetchall()
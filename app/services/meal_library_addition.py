@@ -1,55 +1,174 @@
 # app/services/meal_library_addition.py
-import os
-import sqlite3
+from itertools import islice
 
+from app import db, schema
+from app.services.meal_catalog import invalidate_catalog
 
-def _get_db_path():
-    """Helper to get the absolute path to the main meal library database."""
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
-    return os.path.join(base_dir, "meal-library", "meal_library.db")
+REQUIRED_FIELDS = ["name", "protein", "carbohydrates", "fat", "meal_type", "location"]
+
+# Rows sent to SQLite per executemany call in a bulk add
+INSERT_BATCH_SIZE = 1000
+
+# Most per-row errors listed in a bulk add response (all are counted)
+MAX_REPORTED_ERRORS = 100
+
+MEAL_COLUMNS = "name, calories, carbohydrates, fat, protein, meal_type, location"
+
+# Upsert on the normalized key: an existing meal is replaced in place
+# (an UPDATE, so the search index triggers stay in sync)
+UPSERT_CONFLICT_SQL = f"""
+    ON CONFLICT ({schema.MEAL_KEY_COLUMNS}) DO UPDATE SET
+        name = excluded.name,
+        calories = excluded.calories,
+        carbohydrates = excluded.carbohydrates,
+        fat = excluded.fat,
+        protein = excluded.protein,
+        meal_type = excluded.meal_type,
+        location = excluded.location
+"""
+UPSERT_SQL = f"""
+    INSERT INTO meals ({MEAL_COLUMNS})
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    {UPSERT_CONFLICT_SQL}
+"""
+
+# Bulk adds are validated into this TEMP table first (which never touches
+# the database file), then applied in one short write transaction
+STAGING_TABLE = "temp.meals_adding"
+
+# "WHERE true" keeps SQLite from reading ON CONFLICT as a join constraint;
+# rows are applied in input order, so a repeated meal's last row wins
+APPLY_STAGED_SQL = f"""
+    INSERT INTO meals ({MEAL_COLUMNS})
+    SELECT {MEAL_COLUMNS} FROM {STAGING_TABLE} WHERE true ORDER BY id
+    {UPSERT_CONFLICT_SQL}
+"""
 
 
 def add_single_meal(data):
     """Adds a single meal entry into the meal library database."""
     try:
-        required = ["name", "protein", "carbohydrates", "fat", "meal_type", "location"]
-        missing = [f for f in required if f not in data]
-        if missing:
-            return {"error": f"Missing required fields: {', '.join(missing)}"}
-
-        # Recalculate calories from macros
-        calories = (
-            (float(data["protein"]) * 4)
-            + (float(data["carbohydrates"]) * 4)
-            + (float(data["fat"]) * 9)
-        )
-
-        db_path = _get_db_path()
-
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            INSERT OR REPLACE INTO meals
-            (name, calories, carbohydrates, fat, protein, meal_type, location)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """,
-            (
-                data["name"].strip(),
-                round(calories, 1),
-                float(data["carbohydrates"]),
-                float(data["fat"]),
-                float(data["protein"]),
-                data["meal_type"].strip(),
-                data["location"].strip(),
-            ),
-        )
-
-        conn.commit()
-        conn.close()
+        row = meal_row(data)
+
+        with db.transaction() as conn:
+            conn.execute(UPSERT_SQL, row)
+
+        invalidate_catalog()
 
         return {"message": f"Meal '{data['name']}' added successfully!"}
 
     except Exception as e:
         return {"error": str(e)}
+
+
+def add_meals(meals, skip_invalid=False):
+    """
+    Adds many meals in one transaction, e.g. from a JSON array or a
+    streamed NDJSON body. Every row is validated; errors are reported per
+    row by its position in the input, including NDJSON lines that failed to
+    decode (passed in as ValueErrors). By default any invalid row rejects
+    the whole batch; with `skip_invalid` the valid rows are still saved.
+
+    The input is read and staged before the write lock is taken, so a slow
+    upload never holds up other writers.
+    """
+    errors = []
+    error_count = 0
+    saved = 0
+
+    def valid_rows():
+        nonlocal error_count
+        for index, data in enumerate(meals):
+            try:
+                if isinstance(data, ValueError):
+                    raise data  # an NDJSON line that failed to decode
+                yield meal_row(data)
+            except (ValueError, TypeError) as e:
+                error_count += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"index": index, "error": str(e)})
+
+    try:
+        with db.connection() as conn:
+            try:
+                conn.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+                schema.create_meals_table(conn, STAGING_TABLE)
+                rows = valid_rows()
+                while True:
+                    batch = list(islice(rows, INSERT_BATCH_SIZE))
+                    if not batch:
+                        break
+                    conn.executemany(
+                        f"INSERT INTO {STAGING_TABLE} ({MEAL_COLUMNS})"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        batch,
+                    )
+                    saved += len(batch)
+                # Ends the implicit transaction, which only wrote TEMP
+                conn.commit()
+
+                if error_count and not skip_invalid:
+                    return {
+                        "error": f"{error_count} invalid meals; nothing was saved.",
+                        "errors": errors,
+                    }
+
+                if saved:
+                    with db.transaction() as write:
+                        write.execute(APPLY_STAGED_SQL)
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                conn.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+
+        if saved:
+            invalidate_catalog()
+
+        return {
+            "message": f"{saved} meals saved, {error_count} skipped.",
+            "saved": saved,
+            "skipped": error_count,
+            "errors": errors,
+        }
+
+    except Exception as e:
+        return {"error": str(e), "errors": errors}
+
+
+def meal_row(data):
+    """
+    Validates one meal dict and returns its meals table row, with calories
+    recalculated from the macros. Raises ValueError describing the problem.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Meal must be a JSON object")
+
+    missing = [f for f in REQUIRED_FIELDS if f not in data]
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+
+    macros = {}
+    for field in ("carbohydrates", "fat", "protein"):
+        try:
+            macros[field] = float(data[field])
+        except (TypeError, ValueError):
+            raise ValueError(f"{field} must be a number") from None
+
+    for field in ("name", "meal_type", "location"):
+        if not isinstance(data[field], str) or not data[field].strip():
+            raise ValueError(f"{field} must be a non-empty string")
+
+    # Recalculate calories from macros
+    calories = (
+        (macros["protein"] * 4) + (macros["carbohydrates"] * 4) + (macros["fat"] * 9)
+    )
+
+    return (
+        data["name"].strip(),
+        round(calories, 1),
+        macros["carbohydrates"],
+        macros["fat"],
+        macros["protein"],
+        data["meal_type"].strip(),
+        data["location"].strip(),
+    )
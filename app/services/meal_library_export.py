@@ -0,0 +1,65 @@
+# app/services/meal_library_export.py
+import csv
+import io
+import json
+
+from app import db
+from app.services.meal_library_viewer import meal_filters
+
+# Same columns and order as meal-library/meals.csv, so an export can be
+# uploaded again as-is
+EXPORT_COLUMNS = [
+    "name",
+    "calories",
+    "carbohydrates",
+    "fat",
+    "protein",
+    "location",
+    "meal_type",
+]
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+# Rows fetched from the cursor (and written out) per chunk
+EXPORT_BATCH_SIZE = 500
+
+
+def export_meals(
+    fmt="csv", location=None, meal_type=None, min_calories=None, max_calories=None
+):
+    """
+    Streams the meal library (optionally filtered) as CSV or NDJSON text
+    chunks, in insertion order. Rows are read from the cursor a batch at a
+    time, so memory stays flat however large the library is, and the
+    first chunk is ready before the query has finished.
+    Invalid arguments raise ValueError before anything is read.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    where, params = meal_filters(location, meal_type, min_calories, max_calories)
+    query = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM meals WHERE {where} ORDER BY id"
+    return _export_chunks(fmt, query, params)
+
+
+def _export_chunks(fmt, query, params):
+    if fmt == "csv":
+        yield ",".join(EXPORT_COLUMNS) + "\r\n"
+
+    # A single statement reads one consistent snapshot, even if the
+    # library is written while the export is still streaming (WAL)
+    with db.connection() as conn:
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+            if fmt == "csv":
+                out = io.StringIO()
+                csv.writer(out).writerows(rows)
+                yield out.getvalue()
+            else:
+                yield "".join(
+                    json.dumps(dict(zip(EXPORT_COLUMNS, r))) + "\n" for r in rows
+                )
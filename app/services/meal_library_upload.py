@@ -1,88 +1,65 @@
 # app/services/meal_library_upload.py
-import os
 import csv
-import sqlite3
-from werkzeug.utils import secure_filename
+import io
+from contextlib import nullcontext
+from itertools import islice
 
+from app import db, schema
+from app.services.meal_catalog import invalidate_catalog
 
-def _get_db_path():
-    """Helper to get the absolute path to the main meal library database."""
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
-    return os.path.join(base_dir, "meal-library", "meal_library.db")
+# Rows sent to SQLite per executemany call while streaming the upload
+INSERT_BATCH_SIZE = 1000
+
+# Most rows of each kind listed in a delta upload's diff (counts are exact)
+MAX_DIFF_ROWS = 1000
+
+# Columns compared between the live library and a delta upload
+DIFF_COLUMNS = (
+    "name",
+    "calories",
+    "carbohydrates",
+    "fat",
+    "protein",
+    "meal_type",
+    "location",
+)
+
+# Matches an incoming row (i) to the live meal (m) with the same normalized key
+KEY_MATCH = """
+    m.name_key = i.name_key
+    AND m.location_key IS i.location_key
+    AND m.meal_type_key IS i.meal_type_key
+"""
+CHANGED = " OR ".join(f"m.{c} IS NOT i.{c}" for c in DIFF_COLUMNS)
 
 
 def replace_meal_library_from_csv(uploaded_file):
-    """Replaces the existing meal library with a new uploaded CSV."""
+    """
+    Replaces the existing meal library with a new uploaded CSV.
+
+    The CSV is parsed straight from the upload stream into a staging table
+    in batches, then swapped in within the same transaction, so readers
+    see either the old library or the new one and never an empty table.
+    """
 
     try:
-        # Step 1: Save uploaded CSV file
-        upload_dir = os.path.abspath(
-            os.path.join(os.path.dirname(__file__), "..", "..", "uploads")
-        )
-        os.makedirs(upload_dir, exist_ok=True)
-
-        filename = secure_filename(uploaded_file.filename)
-        filepath = os.path.join(upload_dir, filename)
-        uploaded_file.save(filepath)
-
-        # Step 2: Get absolute DB path
-        db_path = _get_db_path()
-
-        # Create database and table if missing
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS meals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                calories REAL,
-                carbohydrates REAL,
-                fat REAL,
-                protein REAL,
-                meal_type TEXT,
-                location TEXT
-            )
-        """
+        # Step 1: Read the upload as text without saving it to disk
+        stream = io.TextIOWrapper(
+            uploaded_file.stream, encoding="utf-8-sig", newline=""
         )
-        conn.commit()
-
-        # Step 3: Clear existing rows
-        cursor.execute("DELETE FROM meals")
-        conn.commit()
-
-        # Step 4: Import new CSV data
-        with open(filepath, newline="", encoding="utf-8") as csvfile:
-            reader = csv.DictReader(csvfile)
-            count = 0
-            for row in reader:
-                try:
-                    carbs = float(row.get("carbohydrates", 0))
-                    fat = float(row.get("fat", 0))
-                    protein = float(row.get("protein", 0))
-                    calories = round((carbs * 4) + (protein * 4) + (fat * 9), 1)
-                except (ValueError, TypeError):
-                    continue  # Skip malformed rows
-
-                cursor.execute(
-                    """
-                    INSERT INTO meals (name, calories, carbohydrates, fat, protein, meal_type, location)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """,
-                    (
-                        row["name"].strip(),
-                        calories,
-                        carbs,
-                        fat,
-                        protein,
-                        row["meal_type"].strip(),
-                        row.get("location", "Any").strip(),
-                    ),
-                )
-                count += 1
-
-        conn.commit()
-        conn.close()
+        reader = csv.DictReader(stream)
+
+        with db.transaction() as conn:
+            # Steps 2-3: Bulk load the CSV into a fresh staging table
+            count = _stage_rows(conn, reader, "meals_staging")
+
+            # Step 4: Swap the new library in and index it
+            conn.execute("DROP TABLE IF EXISTS meals")
+            conn.execute("ALTER TABLE meals_staging RENAME TO meals")
+            schema.create_meals_indexes(conn)
+            schema.create_meals_search(conn)
+
+        invalidate_catalog()
 
         return {
             "message": f"Meal library uploaded successfully. Existing library replaced with {count} meals."
@@ -90,3 +67,185 @@ def replace_meal_library_from_csv(uploaded_file):
 
     except Exception as e:
         return {"error": str(e)}
+
+
+def apply_meal_library_delta_from_csv(uploaded_file, dry_run=False):
+    """
+    Brings the meal library in line with an uploaded CSV by changing only
+    what differs, matched on the normalized (name, location, meal_type) key:
+    new meals are inserted, changed ones updated and missing ones deleted,
+    all in one transaction. Unchanged rows are not rewritten.
+
+    Returns the diff (counts, plus up to MAX_DIFF_ROWS rows of each kind).
+    With `dry_run` the diff is computed but nothing is written.
+    """
+
+    try:
+        stream = io.TextIOWrapper(
+            uploaded_file.stream, encoding="utf-8-sig", newline=""
+        )
+        reader = csv.DictReader(stream)
+
+        # The incoming rows go to a TEMP table, which never touches the
+        # database file; a dry run holds no write lock at all
+        with db.connection() as conn:
+            try:
+                scope = nullcontext(conn) if dry_run else db.transaction()
+                with scope:
+                    _stage_rows(conn, reader, "temp.meals_incoming")
+                    diff = _diff_incoming(conn)
+                    changed = diff["inserted"] + diff["updated"] + diff["deleted"]
+                    if changed and not dry_run:
+                        _apply_incoming(conn)
+            finally:
+                # Outside any transaction, so a rollback cannot undo the DROP
+                # and leave the table on the pooled connection
+                if conn.in_transaction:
+                    conn.rollback()
+                conn.execute("DROP TABLE IF EXISTS temp.meals_incoming")
+
+        if changed and not dry_run:
+            invalidate_catalog()
+
+        verb = "would change" if dry_run else "changed"
+        return {
+            "message": (
+                f"Delta upload {verb} {changed} meals: {diff['inserted']} added, "
+                f"{diff['updated']} updated, {diff['deleted']} removed, "
+                f"{diff['unchanged']} unchanged."
+            ),
+            "dry_run": dry_run,
+            "diff": diff,
+        }
+
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def _stage_rows(conn, reader, table):
+    # Fresh table with the live schema, bulk loaded in batches
+    conn.execute(f"DROP TABLE IF EXISTS {table}")
+    schema.create_meals_table(conn, table)
+
+    rows = _parse_rows(reader)
+    while True:
+        batch = list(islice(rows, INSERT_BATCH_SIZE))
+        if not batch:
+            break
+        conn.executemany(
+            f"""
+            INSERT INTO {table} (name, calories, carbohydrates, fat, protein, meal_type, location)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+            batch,
+        )
+
+    # Repeated meals in the CSV: the last row wins
+    conn.execute(
+        f"""
+        DELETE FROM {table} WHERE id NOT IN (
+            SELECT MAX(id) FROM {table} GROUP BY {schema.MEAL_KEY_COLUMNS}
+        )
+    """
+    )
+    return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def _diff_incoming(conn):
+    columns = ", ".join(DIFF_COLUMNS)
+    queries = {
+        "inserted": f"""
+            SELECT {columns} FROM temp.meals_incoming AS i
+            WHERE NOT EXISTS (SELECT 1 FROM meals AS m WHERE {KEY_MATCH})
+            ORDER BY i.id
+        """,
+        "deleted": f"""
+            SELECT {columns} FROM meals AS m
+            WHERE NOT EXISTS (SELECT 1 FROM temp.meals_incoming AS i WHERE {KEY_MATCH})
+            ORDER BY m.id
+        """,
+        "updated": f"""
+            SELECT {", ".join(f"m.{c}, i.{c}" for c in DIFF_COLUMNS)}
+            FROM temp.meals_incoming AS i JOIN meals AS m ON {KEY_MATCH}
+            WHERE {CHANGED}
+            ORDER BY m.id
+        """,
+    }
+
+    diff = {}
+    rows = {}
+    truncated = False
+    for kind, query in queries.items():
+        listed = []
+        count = 0
+        for r in conn.execute(query):
+            count += 1
+            if count > MAX_DIFF_ROWS:
+                truncated = True
+                continue
+            if kind == "updated":
+                before, after = r[0::2], r[1::2]
+                entry = dict(zip(DIFF_COLUMNS, after))
+                entry["changes"] = {
+                    c: [old, new]
+                    for c, old, new in zip(DIFF_COLUMNS, before, after)
+                    if old != new
+                }
+                listed.append(entry)
+            else:
+                listed.append(dict(zip(DIFF_COLUMNS, r)))
+        diff[kind] = count
+        rows[kind] = listed
+
+    total = conn.execute("SELECT COUNT(*) FROM temp.meals_incoming").fetchone()[0]
+    diff["unchanged"] = total - diff["inserted"] - diff["updated"]
+    diff["rows"] = rows
+    diff["truncated"] = truncated
+    return diff
+
+
+def _apply_incoming(conn):
+    # Only changed rows are written; the search index triggers follow along
+    conn.execute(
+        f"""
+        DELETE FROM meals AS m
+        WHERE NOT EXISTS (SELECT 1 FROM temp.meals_incoming AS i WHERE {KEY_MATCH})
+    """
+    )
+    conn.execute(
+        f"""
+        UPDATE meals AS m SET {", ".join(f"{c} = i.{c}" for c in DIFF_COLUMNS)}
+        FROM temp.meals_incoming AS i
+        WHERE {KEY_MATCH} AND ({CHANGED})
+    """
+    )
+    conn.execute(
+        f"""
+        INSERT INTO meals (name, calories, carbohydrates, fat, protein, meal_type, location)
+        SELECT name, calories, carbohydrates, fat, protein, meal_type, location
+        FROM temp.meals_incoming AS i
+        WHERE NOT EXISTS (SELECT 1 FROM meals AS m WHERE {KEY_MATCH})
+        ORDER BY i.id
+    """
+    )
+
+
+def _parse_rows(reader):
+    for row in reader:
+        try:
+            carbs = float(row.get("carbohydrates", 0))
+            fat = float(row.get("fat", 0))
+            protein = float(row.get("protein", 0))
+            calories = round((carbs * 4) + (protein * 4) + (fat * 9), 1)
+        except (ValueError, TypeError):
+            continue  # Skip malformed rows
+
+        yield (
+            row["name"].strip(),
+            calories,
+            carbs,
+            fat,
+            protein,
+            row["meal_type"].strip(),
+            row.get("location", "Any").strip(),
+        )
@@ -1,51 +1,181 @@
 # app/services/meal_library_viewer.py
-import os
-import sqlite3
+import base64
+import json
+import re
 
+from app import db
 
-def _get_db_path():
-    """Helper to get the absolute path to the main meal library database."""
-    base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
-    return os.path.join(base_dir, "meal-library", "meal_library.db")
+# Columns /api/meals can sort on, and its page size limits
+SORT_COLUMNS = (
+    "name",
+    "calories",
+    "carbohydrates",
+    "fat",
+    "protein",
+    "meal_type",
+    "location",
+)
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
 
+# Typeahead result limits for /api/meals/search
+DEFAULT_SEARCH_LIMIT = 10
+MAX_SEARCH_LIMIT = 50
+
+
+def list_meals(
+    location=None,
+    meal_type=None,
+    min_calories=None,
+    max_calories=None,
+    sort="name",
+    order="asc",
+    limit=DEFAULT_PAGE_SIZE,
+    cursor=None,
+):
+    """
+    Retrieves one page of meals for the /api/meals endpoint.
+
+    Uses keyset pagination on (sort column, id): `cursor` is the opaque
+    `next_cursor` of the previous page, so every page is an index range
+    scan instead of an OFFSET over everything before it.
+    Invalid arguments raise ValueError; database errors are returned.
+    """
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"sort must be one of: {', '.join(SORT_COLUMNS)}")
+    if order not in ("asc", "desc"):
+        raise ValueError("order must be 'asc' or 'desc'")
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    after = _decode_cursor(cursor) if cursor else None
 
-def view_all_meals():
-    """Retrieves all meals from the meal library database."""
     try:
-        db_path = _get_db_path()
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-
-        cursor.execute(
-            """
-            SELECT name, calories, carbohydrates, fat, protein, meal_type, location
+        where, params = meal_filters(location, meal_type, min_calories, max_calories)
+        query = f"""
+            SELECT id, name, calories, carbohydrates, fat, protein, meal_type, location
             FROM meals
-            ORDER BY location, meal_type, name
+            WHERE {where}
         """
-        )
+        if after:
+            # Continue strictly after the last row of the previous page
+            clause, after_params = _after_clause(sort, order, *after)
+            query += f" AND {clause}"
+            params.extend(after_params)
+
+        query += f" ORDER BY {sort} {order.upper()}, id {order.upper()} LIMIT ?"
+        params.append(limit + 1)
 
-        meals = cursor.fetchall()
-        conn.close()
+        with db.connection() as conn:
+            rows = conn.execute(query, params).fetchall()
 
-        return meals, None
+        meals = [
+            {
+                "id": r[0],
+                "name": r[1],
+                "calories": r[2],
+                "carbohydrates": r[3],
+                "fat": r[4],
+                "protein": r[5],
+                "meal_type": r[6],
+                "location": r[7],
+            }
+            for r in rows[:limit]
+        ]
+
+        next_cursor = None
+        if len(rows) > limit:
+            last = meals[-1]
+            next_cursor = _encode_cursor(last[sort], last["id"])
+
+        return {"meals": meals, "next_cursor": next_cursor, "limit": limit}, None
 
     except Exception as e:
         return None, str(e)
 
 
-def get_meal_names_and_locations():
-    """Retrieves meal names and locations for dropdown menus (like delete-meal)."""
+def meal_filters(location=None, meal_type=None, min_calories=None, max_calories=None):
+    """Builds the WHERE clause (and its parameters) shared by list and export."""
+    clauses = ["1 = 1"]
+    params = []
+    if location:
+        clauses.append("location_key = LOWER(TRIM(?))")
+        params.append(location)
+    if meal_type:
+        clauses.append("meal_type_key = LOWER(TRIM(?))")
+        params.append(meal_type)
+    if min_calories is not None:
+        clauses.append("calories >= ?")
+        params.append(float(min_calories))
+    if max_calories is not None:
+        clauses.append("calories <= ?")
+        params.append(float(max_calories))
+    return " AND ".join(clauses), params
+
+
+def _after_clause(sort, order, value, row_id):
+    # SQLite sorts NULLs first ascending and last descending, while a row
+    # value comparison with NULL is never true, so NULLs get their own branch
+    op = ">" if order == "asc" else "<"
+    if value is None:
+        clause = f"({sort} IS NULL AND id {op} ?)"
+        if order == "asc":
+            clause = f"({clause} OR {sort} IS NOT NULL)"
+        return clause, [row_id]
+    clause = f"({sort}, id) {op} (?, ?)"
+    if order == "desc":
+        clause = f"({clause} OR {sort} IS NULL)"
+    return clause, [value, row_id]
+
+
+def _encode_cursor(value, row_id):
+    raw = json.dumps([value, row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_cursor(cursor):
     try:
-        db_path = _get_db_path()
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return [value, int(row_id)]
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
 
-        cursor.execute("SELECT name, location FROM meals ORDER BY location, name")
-        meals = cursor.fetchall()
-        conn.close()
 
-        return meals, None
+def search_meals(query, limit=DEFAULT_SEARCH_LIMIT):
+    """
+    Typeahead search over meal name and location using the FTS5 index.
+    Every word of `query` must prefix-match; best matches come first.
+    """
+    # Quote each word so user input cannot inject FTS5 query syntax
+    words = re.findall(r"\w+", query or "")
+    if not words:
+        return [], None
+    match = " ".join(f'"{w}"*' for w in words)
+    limit = max(1, min(int(limit), MAX_SEARCH_LIMIT))
+
+    try:
+        with db.connection() as conn:
+            rows = conn.execute(
+                """
+                SELECT meals.id, meals.name, meals.location, meals.meal_type,
+                       meals.calories
+                FROM meals_fts
+                JOIN meals ON meals.id = meals_fts.rowid
+                WHERE meals_fts MATCH ?
+                ORDER BY rank
+                LIMIT ?
+            """,
+                (match, limit),
+            ).fetchall()
+
+        return [
+            {
+                "id": r[0],
+                "name": r[1],
+                "location": r[2],
+                "meal_type": r[3],
+                "calories": r[4],
+            }
+            for r in rows
+        ], None
 
     except Exception as e:
         return None, str(e)
@@ -1,28 +1,210 @@
 # app/services/meal_planner.py
+import hashlib
+import os
+import random
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from itertools import islice
 
 from app.services.user_nutrition import calories_required
-from app.services.meal_generator import generate_meal_plan
+from app.services.meal_generator import (
+    DEFAULT_MAX_REPEATS,
+    FOOD_MAX_ITEMS,
+    generate_meal_plan,
+    generate_multi_day_plan,
+    plan_index_ready,
+)
+from app.services.meal_catalog import get_catalog, normalize_key
+from app.services.macro_scoring import (
+    CALORIES_PER_GRAM,
+    DEFAULT_WEIGHTS,
+    macro_targets_from_ratios,
+)
+from app.services.plan_cache import PlanCache
+
+REQUIRED_FIELDS = [
+    "age",
+    "height_in",
+    "weight_lb",
+    "gender",
+    "activity_level",
+    "goal",
+    "breakfast_location",
+    "lunch_location",
+    "dinner_location",
+]
+
+# Seeded plans kept in memory, keyed by plan_cache_key()
+PLAN_CACHE_SIZE = 1024
+plan_cache = PlanCache(PLAN_CACHE_SIZE)
+
+# Profiles read from a cohort per round of batch work
+BATCH_CHUNK_SIZE = 10_000
+
+# Unique plans in a round before worker processes can pay for themselves;
+# below this, pickling plans back costs more than generating them here
+PROCESS_THRESHOLD = 2000
+
+# Plans per task sent to a worker; small, so results stream back steadily
+WORKER_CHUNK_SIZE = 16
+
+# Long-lived worker pool for large cohorts (each worker keeps its catalog)
+_pool = None
+_pool_lock = threading.Lock()
 
 
 def generate_full_meal_plan(data):
-    """Generates Meal Plan"""
-    required_fields = [
-        "age",
-        "height_in",
-        "weight_lb",
-        "gender",
-        "activity_level",
-        "goal",
-        "breakfast_location",
-        "lunch_location",
-        "dinner_location",
-    ]
-    missing = [f for f in required_fields if f not in data]
+    """
+    Generates Meal Plan.
+    Optional `days` (default 1) builds a multi-day plan in which each food
+    item appears at most `max_repeats` times.
+    Optional `macro_targets` (daily grams) or `macro_ratios` (shares of
+    calories) for protein/carbs/fat switch on macro-aware scoring, with
+    optional `macro_weights`.
+    A `seed` (or a `user_id`, seeded per day) makes the plan reproducible;
+    seeded plans are served from `plan_cache` until the library changes.
+    Optional `max_items` (1-6, default 3) sets the food items per meal.
+    Plans whose search ran out of time are marked `exact: false` and are
+    not cached, nor are plans made while the library's combination index
+    is still being rebuilt.
+    """
+    key = plan_cache_key(data)
+    cacheable = False
+    if key is not None:
+        cached = plan_cache.get(key)
+        if cached is not None:
+            return cached
+        cacheable = plan_index_ready(get_catalog().snapshot())
+
+    # Step 1: Calculate required daily calories
+    required_calories = _required_calories(data)
+    macro_targets = _macro_targets(data, required_calories)
+    macro_weights = _macro_weights(data)
+    seed = plan_seed(data)
+    rng = random.Random(seed) if seed is not None else None
+    max_items = int(data.get("max_items", FOOD_MAX_ITEMS))
+
+    # Step 2: Generate meal plan with per-meal locations
+    days = int(data.get("days", 1))
+    if days == 1:
+        plan = generate_meal_plan(
+            total_calories=required_calories,
+            breakfast_location=data["breakfast_location"],
+            lunch_location=data["lunch_location"],
+            dinner_location=data["dinner_location"],
+            macro_targets=macro_targets,
+            macro_weights=macro_weights,
+            rng=rng,
+            max_items=max_items,
+        )
+    else:
+        max_repeats = data.get("max_repeats", DEFAULT_MAX_REPEATS)
+        plan = generate_multi_day_plan(
+            total_calories=required_calories,
+            days=days,
+            breakfast_location=data["breakfast_location"],
+            lunch_location=data["lunch_location"],
+            dinner_location=data["dinner_location"],
+            max_repeats=None if max_repeats is None else int(max_repeats),
+            macro_targets=macro_targets,
+            macro_weights=macro_weights,
+            rng=rng,
+            max_items=max_items,
+        )
+
+    # Step 3: Structure and return the result
+    result = {"target_daily_calories": required_calories, "meal_plan": plan}
+    if cacheable and plan["exact"]:
+        plan_cache.put(key, result)
+    return result
+
+
+def plan_seed(data):
+    """
+    Returns the seed for a plan request as a string, or None for a random
+    plan. An explicit `seed` wins; otherwise a `user_id` gets one plan per
+    day (`date`, default today).
+    """
+    if data.get("seed") is not None:
+        return str(data["seed"])
+    if data.get("user_id") is not None:
+        day = data.get("date") or date.today().isoformat()
+        return f"{data['user_id']}:{day}"
+    return None
+
+
+def plan_cache_key(data):
+    """
+    Identifies the plan a seeded request produces: calorie target,
+    locations, plan options, seed and library contents. Returns None for
+    unseeded requests, which are random and never cached.
+    """
+    seed = plan_seed(data)
+    if seed is None:
+        return None
+
+    calories, *options = _plan_options(data)
+    library = get_catalog().snapshot().fingerprint
+    return (
+        calories,
+        data["breakfast_location"],
+        data["lunch_location"],
+        data["dinner_location"],
+        *options,
+        seed,
+        library,
+    )
+
+
+def plan_etag(key):
+    """Strong ETag for the response to a seeded request."""
+    return hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+
+
+def batch_processes():
+    """
+    Worker processes used for large cohorts: UFUEL_PLAN_PROCESSES, at most
+    the CPU count. The default of 1 plans every cohort in-process.
+    """
+    configured = int(os.environ.get("UFUEL_PLAN_PROCESSES") or 1)
+    return max(1, min(configured, os.cpu_count() or 1))
+
+
+def generate_meal_plans(profiles):
+    """
+    Generates plans for a whole cohort of user profiles.
+
+    Each profile is planned exactly as by /generate-plan (same options,
+    seeds and plan cache). Yields one result per profile, in input order,
+    as soon as its plan is ready, carrying the profile's `index` (and `id`
+    if given); an invalid profile yields an `error` entry instead.
+    Profiles that get the same plan (identical seeded requests, or unseeded
+    ones with the same calorie target, locations and options) share one
+    generated plan.
+
+    Plans are generated in-process unless batch_processes() > 1 and a round
+    of BATCH_CHUNK_SIZE profiles holds at least PROCESS_THRESHOLD unique
+    plans; those are mapped over a long-lived pool in small chunks.
+    """
+    processes = batch_processes()
+    # Reading ahead only pays when a round may be farmed out to workers
+    chunk_size = BATCH_CHUNK_SIZE if processes > 1 else 1
+    plans = {}  # batch key -> generated result (or exception)
+    rows = enumerate(profiles)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield from _generate_chunk(chunk, plans, processes)
+
+
+def _required_calories(data):
+    missing = [f for f in REQUIRED_FIELDS if f not in data]
     if missing:
         raise ValueError(f"Missing required fields: {', '.join(missing)}")
 
-    # Step 1: Calculate required daily calories
-    required_calories = calories_required(
+    return calories_required(
         age=data["age"],
         height_in=data["height_in"],
         weight_lb=data["weight_lb"],
@@ -31,13 +213,145 @@ def generate_full_meal_plan(data):
         goal=data["goal"],
     )
 
-    # Step 2: Generate meal plan with per-meal locations
-    plan = generate_meal_plan(
-        total_calories=required_calories,
-        breakfast_location=data["breakfast_location"],
-        lunch_location=data["lunch_location"],
-        dinner_location=data["dinner_location"],
+
+def _macro_targets(data, total_calories):
+    field = "macro_targets" if data.get("macro_targets") else "macro_ratios"
+    given = data.get(field)
+    if not given:
+        return None
+    if not isinstance(given, dict):
+        raise ValueError(f"{field} must be an object")
+
+    unknown = [m for m in given if m not in CALORIES_PER_GRAM]
+    if unknown:
+        raise ValueError(f"Unknown macros: {', '.join(unknown)}")
+    invalid = [
+        m
+        for m, v in given.items()
+        if isinstance(v, bool) or not isinstance(v, (int, float)) or v < 0
+    ]
+    if invalid:
+        raise ValueError(f"{field} must be non-negative numbers: {', '.join(invalid)}")
+
+    if field == "macro_targets":
+        return {macro: float(grams) for macro, grams in given.items()}
+    if sum(given.values()) > 1:
+        raise ValueError("macro_ratios must add up to at most 1")
+    return macro_targets_from_ratios(total_calories, given)
+
+
+def _macro_weights(data):
+    weights = data.get("macro_weights")
+    if not weights:
+        return None
+    if not isinstance(weights, dict):
+        raise ValueError("macro_weights must be an object")
+
+    unknown = [m for m in weights if m not in DEFAULT_WEIGHTS]
+    if unknown:
+        raise ValueError(f"Unknown macro weights: {', '.join(unknown)}")
+    invalid = [
+        m
+        for m, w in weights.items()
+        if isinstance(w, bool) or not isinstance(w, (int, float))
+    ]
+    if invalid:
+        raise ValueError(f"macro_weights must be numbers: {', '.join(invalid)}")
+    return {macro: float(w) for macro, w in weights.items()}
+
+
+def _plan_options(data):
+    # Everything besides locations and seed that decides a plan
+    calories = _required_calories(data)
+    macros = _macro_targets(data, calories)
+    weights = _macro_weights(data)
+    days = int(data.get("days", 1))
+    max_repeats = data.get("max_repeats", DEFAULT_MAX_REPEATS) if days > 1 else None
+    if max_repeats is not None:
+        max_repeats = int(max_repeats)
+    return (
+        calories,
+        tuple(sorted(macros.items())) if macros else None,
+        tuple(sorted(weights.items())) if weights else None,
+        days,
+        max_repeats,
+        int(data.get("max_items", FOOD_MAX_ITEMS)),
     )
 
-    # Step 3: Structure and return the result
-    return {"target_daily_calories": required_calories, "meal_plan": plan}
+
+def _batch_key(data):
+    # Seeded profiles share a plan only with identical requests; unseeded
+    # ones with any profile of the same target, locations and options.
+    # The options are read first, so an invalid profile gets the usual error.
+    calories, *options = _plan_options(data)
+    key = plan_cache_key(data)
+    if key is not None:
+        return key
+    locations = (
+        data["breakfast_location"],
+        data["lunch_location"],
+        data["dinner_location"],
+    )
+    return (calories, *(normalize_key(loc) for loc in locations), *options)
+
+
+def _plan_or_error(data):
+    # Runs in a worker process too; exceptions are returned, not raised
+    try:
+        return generate_full_meal_plan(data)
+    except Exception as e:
+        return e
+
+
+def _batch_entry(index, data, **fields):
+    entry = {"index": index}
+    if isinstance(data, dict) and "id" in data:
+        entry["id"] = data["id"]
+    entry.update(fields)
+    return entry
+
+
+def _worker_pool(processes):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=processes)
+        return _pool
+
+
+def _generate_chunk(chunk, plans, processes):
+    entries = []  # (index, profile, batch key or the exception it raised)
+    work = {}  # batch key -> first profile needing it, if not yet planned
+    for index, data in chunk:
+        try:
+            if isinstance(data, Exception):
+                raise data  # a line that failed to decode
+            key = _batch_key(data)
+        except Exception as e:
+            entries.append((index, data, e))
+            continue
+        if key not in plans:
+            work.setdefault(key, data)
+        entries.append((index, data, key))
+
+    # Both maps are lazy and yield in `work` order, which is the order the
+    # entries first need each key, so every entry goes out once its own
+    # plan (and those before it) are done
+    if len(work) >= PROCESS_THRESHOLD and processes > 1:
+        results = _worker_pool(processes).map(
+            _plan_or_error, work.values(), chunksize=WORKER_CHUNK_SIZE
+        )
+    else:
+        results = map(_plan_or_error, work.values())
+    pending = zip(work, results)
+
+    for index, data, key in entries:
+        if not isinstance(key, Exception):
+            while key not in plans:
+                planned, result = next(pending)
+                plans[planned] = result
+        outcome = key if isinstance(key, Exception) else plans[key]
+        if isinstance(outcome, Exception):
+            yield _batch_entry(index, data, error=str(outcome))
+        else:
+            yield _batch_entry(index, data, **outcome)
@@ -1,4 +1,19 @@
 # app/services/nutrition.py
+import numpy as np
+
+# calories_required always returns a multiple of CALORIE_STEP in this range
+MIN_CALORIES = 1000
+MAX_CALORIES = 5000
+CALORIE_STEP = 10
+
+# TDEE multiplier per activity level (unknown levels count as sedentary)
+ACTIVITY_FACTORS = {"sedentary": 1.2, "moderate": 1.55, "active": 1.725}
+DEFAULT_ACTIVITY_FACTOR = 1.2
+
+# Daily calorie adjustment per goal (anything else maintains)
+GOAL_ADJUSTMENTS = {"gain": 500, "lose": -500}
+
+
 def calories_required(age, height_in, weight_lb, gender, activity_level, goal):
     """Calculates the TDEE calories required using Mifflin-St Jeor"""
     # Convert to metric
@@ -12,15 +27,11 @@ def calories_required(age, height_in, weight_lb, gender, activity_level, goal):
         bmr = 10 * weight_kg + 6.25 * height_cm - 5 * age - 161
 
     # Activity multiplier
-    activity_factors = {"sedentary": 1.2, "moderate": 1.55, "active": 1.725}
-    tdee = bmr * activity_factors.get(activity_level.lower(), 1.2)
+    tdee = bmr * ACTIVITY_FACTORS.get(activity_level.lower(), DEFAULT_ACTIVITY_FACTOR)
 
     # Goal adjustment
-    if goal.lower() == "gain":
-        tdee += 500
-    elif goal.lower() == "lose":
-        tdee -= 500
-    tdee = round(tdee / 10) * 10
+    tdee += GOAL_ADJUSTMENTS.get(goal.lower(), 0)
+    tdee = round(tdee / CALORIE_STEP) * CALORIE_STEP
 
     """
     Formula
@@ -37,7 +48,39 @@ def calories_required(age, height_in, weight_lb, gender, activity_level, goal):
     """
 
     # Ensure between 1000 and 5000 calories
-    tdee = min(tdee, 5000)
-    tdee = max(1000, tdee)
+    tdee = min(tdee, MAX_CALORIES)
+    tdee = max(MIN_CALORIES, tdee)
 
     return int(tdee)
+
+
+def calories_required_array(age, height_in, weight_lb, gender, activity_level, goal):
+    """
+    calories_required for a whole population at once: each argument is an
+    array with one entry per person. Returns an int array, rounded and
+    clamped exactly like calories_required.
+    """
+    weight_kg = np.asarray(weight_lb, dtype=float) * 0.453592
+    height_cm = np.asarray(height_in, dtype=float) * 2.54
+
+    male = _lookup(gender, {"male": True}, False)
+    bmr = (
+        10 * weight_kg
+        + 6.25 * height_cm
+        - 5 * np.asarray(age, dtype=float)
+        + np.where(male, 5, -161)
+    )
+
+    tdee = bmr * _lookup(activity_level, ACTIVITY_FACTORS, DEFAULT_ACTIVITY_FACTOR)
+    tdee += _lookup(goal, GOAL_ADJUSTMENTS, 0)
+    # np.round rounds half to even, like round()
+    tdee = np.round(tdee / CALORIE_STEP) * CALORIE_STEP
+
+    return np.clip(tdee, MIN_CALORIES, MAX_CALORIES).astype(int)
+
+
+def _lookup(values, table, default):
+    # Maps each distinct (case-insensitive) label once, then broadcasts
+    labels, inverse = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    mapped = np.array([table.get(label.lower(), default) for label in labels])
+    return mapped[inverse]
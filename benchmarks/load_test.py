@@ -0,0 +1,398 @@
+# benchmarks/load_test.py
+"""
+Load test that replays a realistic request mix against the Flask app.
+
+    python benchmarks/load_test.py                           # 20 clients for 30 s
+    python benchmarks/load_test.py --rate 50 --duration 60   # 50 requests/s
+    python benchmarks/load_test.py --mix generate-plan=90,view-meals=10
+    python benchmarks/load_test.py --url http://127.0.0.1:5000
+
+Without --url the app is started with `flask run` (threaded) on a free port,
+against a synthetic library of --size items per location in a temporary
+database. Point --url only at a throwaway server: the mix adds meals and
+replaces the library.
+
+By default --concurrency clients each send their next request as soon as
+the last one returns (closed loop). With --rate, requests start on a
+Poisson schedule however fast the server answers (open loop), and latency
+is measured from the scheduled start, so queueing shows up in it;
+--concurrency then caps the requests in flight.
+
+Reports throughput, p50/p95/p99 latency and error rate per route, and
+counts failures caused by SQLite lock contention ("database is locked")
+separately. The report is also written to benchmarks/results/load_test.json.
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+# Allow running from benchmarks/ without installing the app package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_PATH = os.path.join(BENCH_DIR, "results", "load_test.json")
+
+# Relative weights of each request kind; mostly students generating plans
+DEFAULT_MIX = {
+    "generate-plan": 80,
+    "view-meals": 15,
+    "add-meal": 4,
+    "upload-meal-library": 1,
+}
+
+DEFAULT_SIZE = 100
+DEFAULT_CONCURRENCY = 20
+DEFAULT_DURATION = 30.0
+REQUEST_TIMEOUT = 30.0
+SERVER_START_TIMEOUT = 30.0
+
+# Share of plan requests sent with a user_id (seeded, so cacheable), and
+# how many distinct students they come from
+SEEDED_SHARE = 0.5
+STUDENTS = 5000
+
+LOCK_ERROR = "database is locked"
+PERCENTILES = (50, 95, 99)
+
+
+class Workload:
+    """Builds randomized requests of each kind in DEFAULT_MIX."""
+
+    def __init__(self, base_url, size):
+        from synthetic_library import LOCATIONS, MEAL_TYPE_SHARES, synthetic_csv
+
+        self.base_url = base_url.rstrip("/")
+        self.locations = LOCATIONS
+        self.meal_types = list(MEAL_TYPE_SHARES)
+        self._added = itertools.count()
+        # Uploads alternate between two libraries so each one changes rows
+        self._uploads = [
+            multipart({"mode": "replace"}, "file", "library.csv", synthetic_csv(size, seed))
+            for seed in (0, 1)
+        ]
+
+    def request(self, kind, rng):
+        return getattr(self, kind.replace("-", "_"))(rng)
+
+    def generate_plan(self, rng):
+        profile = {
+            "age": rng.randint(17, 30),
+            "height_in": rng.randint(58, 78),
+            "weight_lb": rng.randint(100, 260),
+            "gender": rng.choice(("male", "female")),
+            "activity_level": rng.choice(("sedentary", "moderate", "active")),
+            "goal": rng.choice(("maintain", "lose", "gain")),
+            "breakfast_location": rng.choice(self.locations),
+            "lunch_location": rng.choice(self.locations),
+            "dinner_location": rng.choice(self.locations),
+        }
+        if rng.random() < SEEDED_SHARE:
+            profile["user_id"] = rng.randrange(STUDENTS)
+        return self._json("/generate-plan", profile)
+
+    def view_meals(self, rng):
+        # The viewer page itself is static; its rows come from /api/meals
+        query = urllib.parse.urlencode({
+            "location": rng.choice(self.locations),
+            "meal_type": rng.choice(self.meal_types),
+            "sort": rng.choice(("name", "calories")),
+            "limit": 50,
+        })
+        return urllib.request.Request(f"{self.base_url}/api/meals?{query}")
+
+    def add_meal(self, rng):
+        return self._json("/add-meal", {
+            "name": f"Load Test Item {next(self._added)}",
+            "protein": rng.randint(0, 40),
+            "carbohydrates": rng.randint(0, 80),
+            "fat": rng.randint(0, 30),
+            "meal_type": rng.choice(self.meal_types),
+            "location": rng.choice(self.locations),
+        })
+
+    def upload_meal_library(self, rng):
+        content_type, body = rng.choice(self._uploads)
+        return urllib.request.Request(
+            f"{self.base_url}/upload-meal-library",
+            data=body,
+            headers={"Content-Type": content_type},
+        )
+
+    def _json(self, path, payload):
+        return urllib.request.Request(
+            self.base_url + path,
+            data=json.dumps(payload).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+
+
+def multipart(fields, file_field, filename, content):
+    """Encodes form fields plus one file as (content type, body)."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode()
+        )
+    parts.append(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{file_field}"; '
+        f'filename="{filename}"\r\nContent-Type: text/csv\r\n\r\n'.encode()
+    )
+    parts.append(content)
+    parts.append(f"\r\n--{boundary}--\r\n".encode())
+    return f"multipart/form-data; boundary={boundary}", b"".join(parts)
+
+
+def send(request):
+    """Returns (status, error text or None); network failures are status 0."""
+    try:
+        with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+            response.read()
+            return response.status, None
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode("utf-8", "replace")
+    except (urllib.error.URLError, OSError) as e:
+        return 0, str(e)
+
+
+class Recorder:
+    """
+    Collects (kind, seconds, status, error) for every finished request, and
+    counts open-loop requests still queued when the test ended.
+    """
+
+    def __init__(self):
+        self.samples = []
+        self.unstarted = 0
+        self._lock = threading.Lock()
+
+    def timed(self, workload, kind, rng, started=None):
+        request = workload.request(kind, rng)
+        started = time.perf_counter() if started is None else started
+        status, error = send(request)
+        with self._lock:
+            self.samples.append((kind, time.perf_counter() - started, status, error))
+
+
+def run_closed_loop(workload, mix, concurrency, duration, seed):
+    recorder = Recorder()
+    kinds, weights = zip(*mix.items())
+    deadline = time.perf_counter() + duration
+
+    def client(n):
+        rng = random.Random(f"{seed}:{n}")
+        while time.perf_counter() < deadline:
+            recorder.timed(workload, rng.choices(kinds, weights)[0], rng)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return recorder
+
+
+def run_open_loop(workload, mix, rate, concurrency, duration, seed):
+    recorder = Recorder()
+    kinds, weights = zip(*mix.items())
+    rng = random.Random(seed)
+    started = time.perf_counter()
+
+    pool = ThreadPoolExecutor(max_workers=concurrency)
+    futures = []
+    scheduled = started
+    while scheduled < started + duration:
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        kind = rng.choices(kinds, weights)[0]
+        request_rng = random.Random(rng.random())
+        futures.append(pool.submit(recorder.timed, workload, kind, request_rng, scheduled))
+        scheduled += rng.expovariate(rate)
+
+    # Requests in flight finish; a backlog the server never got to is dropped
+    pool.shutdown(wait=True, cancel_futures=True)
+    recorder.unstarted = sum(1 for f in futures if f.cancelled())
+    return recorder
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    return sorted_values[max(0, math.ceil(p / 100 * len(sorted_values)) - 1)]
+
+
+def summarize(samples, elapsed):
+    """Per-route (and total) throughput, latency percentiles and errors."""
+    by_route = {}
+    for sample in samples:
+        by_route.setdefault(sample[0], []).append(sample)
+    by_route["total"] = samples
+
+    report = {}
+    for route, rows in by_route.items():
+        latencies = sorted(r[1] for r in rows)
+        errors = [r for r in rows if not 200 <= r[2] < 400]
+        locked = [r for r in errors if r[3] and LOCK_ERROR in r[3]]
+        report[route] = {
+            "requests": len(rows),
+            "throughput": round(len(rows) / elapsed, 2),
+            **{f"p{p}_ms": round(percentile(latencies, p) * 1000, 1) for p in PERCENTILES},
+            "errors": len(errors),
+            "error_rate": round(len(errors) / len(rows), 4),
+            "locked": len(locked),
+            "statuses": {str(s): sum(1 for r in rows if r[2] == s) for s in sorted({r[2] for r in rows})},
+        }
+        other = [r[3] for r in errors if r not in locked and r[3]]
+        if other:
+            report[route]["sample_error"] = other[0][:200]
+    return report
+
+
+def print_report(report):
+    print(f"\n{'route':<22} {'requests':>9} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'errors':>8} {'locked':>7}")
+    for route, row in report.items():
+        print(f"{route:<22} {row['requests']:>9} {row['throughput']:>8.1f} {row['p50_ms']:>9.1f} "
+              f"{row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['error_rate']:>8.1%} {row['locked']:>7}")
+    for route, row in report.items():
+        if "sample_error" in row and route != "total":
+            print(f"  {route}: {row['sample_error']}")
+    if report["total"]["locked"]:
+        print(f"\n{report['total']['locked']} request(s) failed on SQLite lock contention "
+              f"({LOCK_ERROR!r}).")
+
+
+def parse_mix(text):
+    """Parses "generate-plan=80,view-meals=20" into a weight per route."""
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(
+                f"unknown route {kind!r}; choose from {', '.join(DEFAULT_MIX)}")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(db_path, log_path):
+    """Starts the app on a free port; returns (process, base url)."""
+    port = free_port()
+    env = dict(os.environ, UFUEL_DB_PATH=db_path, FLASK_DEBUG="0")
+    log = open(log_path, "w")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "flask", "--app", "app", "run", "--port", str(port), "--with-threads"],
+        cwd=REPO_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+
+    deadline = time.perf_counter() + SERVER_START_TIMEOUT
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            break
+        status, _ = send(urllib.request.Request(f"{base_url}/metrics"))
+        if status == 200:
+            return process, base_url
+        time.sleep(0.2)
+    process.terminate()
+    with open(log_path) as f:
+        raise RuntimeError(f"App did not start:\n{f.read()[-2000:]}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", help="test a running app instead of starting one")
+    parser.add_argument("--size", type=int, default=DEFAULT_SIZE,
+                        help="items per location in the synthetic library")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                        help="route weights, e.g. generate-plan=80,view-meals=15,add-meal=4,upload-meal-library=1")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="concurrent clients (with --rate: most requests in flight)")
+    parser.add_argument("--rate", type=float, help="open loop: requests started per second")
+    parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=RESULTS_PATH)
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, BENCH_DIR)
+    with tempfile.TemporaryDirectory() as tmp:
+        process = None
+        base_url = args.url
+        if base_url is None:
+            from synthetic_library import build_synthetic_db
+
+            db_path = build_synthetic_db(os.path.join(tmp, "load.db"), args.size)
+            process, base_url = start_server(db_path, os.path.join(tmp, "server.log"))
+        try:
+            workload = Workload(base_url, args.size)
+            # Warm up the catalog and combination index outside the measurement
+            send(workload.generate_plan(random.Random(args.seed)))
+
+            mode = f"{args.rate:g} req/s" if args.rate else f"{args.concurrency} clients"
+            print(f"Load testing {base_url} for {args.duration:g}s at {mode}")
+            started = time.perf_counter()
+            if args.rate:
+                recorder = run_open_loop(workload, args.mix, args.rate, args.concurrency,
+                                         args.duration, args.seed)
+            else:
+                recorder = run_closed_loop(workload, args.mix, args.concurrency,
+                                           args.duration, args.seed)
+            elapsed = time.perf_counter() - started
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    if not recorder.samples:
+        print("No requests completed.")
+        return 1
+    report = summarize(recorder.samples, elapsed)
+    print_report(report)
+    if recorder.unstarted:
+        print(f"{recorder.unstarted} scheduled request(s) were still queued when the test "
+              f"ended: the server could not keep up with {args.rate:g} req/s.")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({
+            "meta": {
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "url": args.url or "local",
+                "size": args.size,
+                "mix": args.mix,
+                "concurrency": args.concurrency,
+                "rate": args.rate,
+                "duration": args.duration,
+                "unstarted": recorder.unstarted,
+            },
+            "routes": report,
+        }, f, indent=2)
+    print(f"\nReport written to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,184 @@
+# benchmarks/run_benchmarks.py
+"""
+Microbenchmarks for plan generation and the meal library paths.
+
+    python benchmarks/run_benchmarks.py                  # run and compare to baseline
+    python benchmarks/run_benchmarks.py --update-baseline
+    python benchmarks/run_benchmarks.py --sizes 10 100 --threshold 0.25
+
+Each case runs against a synthetic library of N items per location in a
+temporary database. Results (seconds per call) are written to
+benchmarks/results/latest.json; a case slower than the baseline by more
+than the threshold counts as a regression and the exit code is 1.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timezone
+
+# Allow running from benchmarks/ without installing the app package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+RESULTS_PATH = os.path.join(BENCH_DIR, "results", "latest.json")
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+DEFAULT_THRESHOLD = 0.2
+
+# Each case is timed for at least this long (or one call, if slower)
+MIN_SECONDS = 0.2
+
+PROFILE = {
+    "age": 20,
+    "height_in": 70,
+    "weight_lb": 170,
+    "gender": "male",
+    "activity_level": "moderate",
+    "goal": "maintain",
+    "breakfast_location": "Glen",
+    "lunch_location": "Newell",
+    "dinner_location": "West Village",
+}
+
+
+def time_call(func):
+    """Returns the best seconds-per-call over a few autoranged rounds."""
+    # One untimed call first, so lazily built caches are not charged to warm cases
+    func()
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    if elapsed > MIN_SECONDS * 5:
+        return elapsed / number
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+
+def bench_size(size, db_path):
+    from werkzeug.datastructures import FileStorage
+
+    from app import db
+    from app.services.meal_catalog import get_catalog, invalidate_catalog
+    from app.services.meal_generator import choose_best_combination, fetch_all
+    from app.services.meal_library_upload import replace_meal_library_from_csv
+    from app.services.meal_library_viewer import list_meals
+    from app.services.meal_planner import generate_full_meal_plan
+    from synthetic_library import build_synthetic_db, synthetic_csv
+
+    build_synthetic_db(db_path, size)
+    invalidate_catalog(db_path)
+    lunch = get_catalog(db_path).get("lunch", "Newell")
+    csv_bytes = synthetic_csv(size)
+
+    def fetch():
+        with db.connection(db_path) as conn:
+            fetch_all(conn.cursor(), "lunch", "Newell")
+
+    def upload():
+        file = FileStorage(stream=io.BytesIO(csv_bytes), filename="bench.csv")
+        result = replace_meal_library_from_csv(file)
+        if "error" in result:
+            raise RuntimeError(result["error"])
+
+    def plan_cold():
+        invalidate_catalog()
+        generate_full_meal_plan(PROFILE)
+
+    cases = {
+        "choose_best_combination": lambda: choose_best_combination(lunch, 700),
+        "fetch_all": fetch,
+        "list_meals": list_meals,
+        "generate_full_meal_plan": lambda: generate_full_meal_plan(PROFILE),
+        "generate_full_meal_plan_cold": plan_cold,
+        "replace_meal_library_from_csv": upload,
+    }
+
+    results = {}
+    for name, func in cases.items():
+        seconds = results[f"{name}[{size}]"] = time_call(func)
+        print(f"  {name:<32} {seconds * 1000:>12.3f} ms")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Prints the change against the baseline; returns the regressed case names."""
+    regressions = []
+    print(f"\n{'case':<44} {'baseline ms':>12} {'now ms':>12} {'change':>8}")
+    for case, seconds in results.items():
+        before = baseline.get(case)
+        if before is None:
+            print(f"{case:<44} {'-':>12} {seconds * 1000:>12.3f} {'new':>8}")
+            continue
+        change = seconds / before - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(case)
+            flag = "  REGRESSION"
+        print(f"{case:<44} {before * 1000:>12.3f} {seconds * 1000:>12.3f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="items per location for each synthetic library")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown before a case counts as a regression")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="store this run as the new baseline")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Point the whole app at a throwaway database before importing it
+        db_path = os.path.join(tmp, "bench.db")
+        os.environ["UFUEL_DB_PATH"] = db_path
+        sys.path.insert(0, BENCH_DIR)
+
+        results = {}
+        for size in args.sizes:
+            print(f"\n{size} items per location")
+            results.update(bench_size(size, db_path))
+
+        from app import db
+        db.close_all()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline updated at {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline yet; run with --update-baseline to store one.")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} case(s) regressed by more than {args.threshold:.0%}")
+        return 1
+    print("\nNo regressions.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
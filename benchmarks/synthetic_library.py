@@ -0,0 +1,76 @@
+# benchmarks/synthetic_library.py
+import csv
+import io
+import os
+import random
+import sys
+
+# Allow running from benchmarks/ without installing the app package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app import db
+from app.schema import migrate
+
+LOCATIONS = ("Glen", "Newell", "West Village")
+
+# Share of each location's items per meal type
+MEAL_TYPE_SHARES = {"breakfast": 0.25, "lunch": 0.3, "dinner": 0.3, "drink": 0.15}
+
+# (carbs, fat, protein) gram ranges per meal type
+MACRO_RANGES = {
+    "breakfast": ((5, 60), (2, 25), (3, 30)),
+    "lunch": ((10, 80), (4, 35), (8, 50)),
+    "dinner": ((10, 90), (4, 40), (10, 60)),
+    "drink": ((0, 50), (0, 10), (0, 12)),
+}
+
+CSV_FIELDS = ["name", "calories", "carbohydrates", "fat", "protein", "location", "meal_type"]
+
+
+def synthetic_meals(items_per_location, seed=0):
+    """Yields meal dicts shaped like meal-library/meals.csv rows."""
+    rng = random.Random(seed)
+    for location in LOCATIONS:
+        for meal_type, share in MEAL_TYPE_SHARES.items():
+            for i in range(max(1, round(items_per_location * share))):
+                carbs, fat, protein = (rng.randint(lo, hi) for lo, hi in MACRO_RANGES[meal_type])
+                yield {
+                    "name": f"{meal_type.title()} Item {i}",
+                    "calories": carbs * 4 + protein * 4 + fat * 9,
+                    "carbohydrates": carbs,
+                    "fat": fat,
+                    "protein": protein,
+                    "location": location,
+                    "meal_type": meal_type,
+                }
+
+
+def synthetic_csv(items_per_location, seed=0):
+    """Returns a synthetic library as CSV bytes, as /upload-meal-library takes it."""
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=CSV_FIELDS)
+    writer.writeheader()
+    writer.writerows(synthetic_meals(items_per_location, seed))
+    return out.getvalue().encode("utf-8")
+
+
+def build_synthetic_db(db_path, items_per_location, seed=0):
+    """Creates (or replaces) a meal library database filled with synthetic meals."""
+    db.close_all()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    migrate(db_path)
+    with db.transaction(db_path) as conn:
+        conn.executemany(
+            """
+            INSERT INTO meals (name, calories, carbohydrates, fat, protein, location, meal_type)
+            VALUES (:name, :calories, :carbohydrates, :fat, :protein, :location, :meal_type)
+            """,
+            synthetic_meals(items_per_location, seed),
+        )
+    return db_path
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    sys.stdout.write(synthetic_csv(size).decode("utf-8"))
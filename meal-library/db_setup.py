@@ -1,32 +1,28 @@
 # meal-library/db_setup.py
-import sqlite3
 import os
+import sys
+
+# Allow running from meal-library/ without installing the app package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.db import connect, get_db_path
+from app.schema import migrate
 
 def initialize_db():
-    # Use an absolute path
-    db_path = os.path.join(os.path.dirname(__file__), 'meal_library.db')
-    conn = sqlite3.connect(db_path)
+    # Shared path configuration (UFUEL_DB_PATH overrides the default)
+    db_path = get_db_path()
+    conn = connect(db_path)
     cursor = conn.cursor()
 
-    # Drop the table if it exists
+    # Drop the table (and its search index) if it exists
     cursor.execute("DROP TABLE IF EXISTS meals")
-
-    # Create the meals table
-    cursor.execute("""
-        CREATE TABLE meals (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            calories INTEGER,
-            carbohydrates INTEGER,
-            fat INTEGER,
-            protein INTEGER,
-            location TEXT,
-            meal_type TEXT NOT NULL
-        )
-    """)
+    cursor.execute("DROP TABLE IF EXISTS meals_fts")
+    cursor.execute("PRAGMA user_version = 0")
 
     conn.commit()
     conn.close()
+
+    # Create the meals table by running every schema migration
+    migrate(db_path)
     print(f"Database initialized at: {db_path}")
 
 if __name__ == "__main__":
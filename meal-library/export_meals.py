@@ -0,0 +1,38 @@
+# meal-library/export_meals.py
+import argparse
+import os
+import sys
+
+# Allow running from meal-library/ without installing the app package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.services.meal_library_export import EXPORT_FORMATS, export_meals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export the meal library as CSV or NDJSON.')
+    parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+    parser.add_argument('--location', help='only meals at this location')
+    parser.add_argument('--meal-type', help='only meals of this type')
+    parser.add_argument('--min-calories', type=float)
+    parser.add_argument('--max-calories', type=float)
+    parser.add_argument('-o', '--output', help='file to write (default: stdout)')
+    args = parser.parse_args(argv)
+
+    chunks = export_meals(
+        args.format,
+        location=args.location,
+        meal_type=args.meal_type,
+        min_calories=args.min_calories,
+        max_calories=args.max_calories,
+    )
+
+    out = open(args.output, 'w', newline='', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# meal-library/forecast_demand.py
+import argparse
+import csv
+import json
+import os
+import sys
+
+# Allow running from meal-library/ without installing the app package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.services.demand_forecast import DEFAULT_CONFIDENCE, DEFAULT_REPLICATES, forecast_demand
+
+ITEM_FIELDS = ['location', 'meal_type', 'name', 'expected', 'lower', 'upper']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Forecast daily portions per item for a simulated student population.')
+    parser.add_argument('population', nargs='?', help='JSON file of population field distributions (default: built-in campus mix)')
+    parser.add_argument('--size', type=int, default=10_000, help='students simulated per day')
+    parser.add_argument('--replicates', type=int, default=DEFAULT_REPLICATES)
+    parser.add_argument('--confidence', type=float, default=DEFAULT_CONFIDENCE)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--json', action='store_true', help='print the full result as JSON instead of a CSV table')
+    args = parser.parse_args(argv)
+
+    population = None
+    if args.population:
+        with open(args.population, encoding='utf-8') as f:
+            population = json.load(f)
+
+    result = forecast_demand(
+        population,
+        size=args.size,
+        replicates=args.replicates,
+        confidence=args.confidence,
+        seed=args.seed,
+    )
+
+    if args.json:
+        json.dump(result, sys.stdout, indent=2)
+        print()
+        return
+
+    writer = csv.DictWriter(sys.stdout, fieldnames=ITEM_FIELDS, extrasaction='ignore')
+    writer.writeheader()
+    writer.writerows(result['items'])
+    print(f"{result['size']} students x {result['replicates']} days, seed {result['seed']}, "
+          f"{result['seconds']}s", file=sys.stderr)
+    if result['sampled_groups']:
+        print(f"Estimated from sampled live searches: {', '.join(result['sampled_groups'])}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,40 @@
 # meal-library/import_meals.py
 import csv
-import sqlite3
 import os
+import sys
+from itertools import islice
 
-def import_meals():
-    db_path = os.path.join(os.path.dirname(__file__), 'meal_library.db')
-    csv_path = os.path.join(os.path.dirname(__file__), 'meals.csv')
+# Allow running from meal-library/ without installing the app package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.db import connect, get_db_path
+from app.schema import MEAL_KEY_COLUMNS, migrate
 
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+# Rows upserted per transaction
+BATCH_SIZE = 5000
 
+# Meals are matched case- and whitespace-insensitively on the normalized key
+UPSERT_SQL = f"""
+    INSERT INTO meals (name, calories, carbohydrates, fat, protein, location, meal_type)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT ({MEAL_KEY_COLUMNS}) DO UPDATE SET
+        calories = excluded.calories,
+        carbohydrates = excluded.carbohydrates,
+        fat = excluded.fat,
+        protein = excluded.protein
+    WHERE calories IS NOT excluded.calories
+       OR carbohydrates IS NOT excluded.carbohydrates
+       OR fat IS NOT excluded.fat
+       OR protein IS NOT excluded.protein
+"""
+
+
+def read_rows(csv_path):
     with open(csv_path, newline='', encoding='utf-8') as csvfile:
         reader = csv.DictReader(csvfile)
         for row in reader:
             # Normalize (strip whitespace and make consistent case)
             name = row['name'].strip()
             location = row['location'].strip()
-            #calories = row['calories'].strip()
             carbs = float(row['carbohydrates'].strip() or 0)
             fat = float(row['fat'].strip() or 0)
             protein = float(row['protein'].strip() or 0)
@@ -24,32 +42,39 @@ def import_meals():
             # Replace calories with calculated calories.
             calories = round((carbs * 4) + (protein * 4) + (fat * 9), 1)
 
-            # Check for an existing meal (case-insensitive match)
-            cursor.execute("""
-                SELECT id FROM meals
-                WHERE LOWER(TRIM(name)) = LOWER(?)
-                  AND LOWER(TRIM(location)) = LOWER(?)
-                  AND LOWER(TRIM(meal_type)) = LOWER(?)
-            """, (name, location, meal_type))
-            existing = cursor.fetchone()
-
-            if existing:
-                cursor.execute("""
-                    UPDATE meals
-                    SET calories = ?, carbohydrates = ?, fat = ?, protein = ?
-                    WHERE id = ?
-                """, (calories, carbs, fat, protein, existing[0]))
-                print(f"Updated: {name} ({meal_type}, {location})")
-            else:
-                cursor.execute("""
-                    INSERT INTO meals (name, calories, carbohydrates, fat, protein, location, meal_type)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                """, (name, calories, carbs, fat, protein, location, meal_type))
-                print(f"Added: {name} ({meal_type}, {location})")
-
-    conn.commit()
+            yield (name, calories, carbs, fat, protein, location, meal_type)
+
+
+def import_meals(csv_path=None):
+    csv_path = csv_path or os.path.join(os.path.dirname(__file__), 'meals.csv')
+
+    # The upsert relies on the unique key index of the current schema
+    migrate()
+    conn = connect(get_db_path())
+
+    added = updated = unchanged = 0
+    rows = read_rows(csv_path)
+    while True:
+        batch = list(islice(rows, BATCH_SIZE))
+        if not batch:
+            break
+
+        with conn:
+            before_rows = conn.execute("SELECT COUNT(*) FROM meals").fetchone()[0]
+            # rowcount counts only rows the upsert itself wrote, not the
+            # search index trigger writes that total_changes includes
+            changes = conn.executemany(UPSERT_SQL, batch).rowcount
+            after_rows = conn.execute("SELECT COUNT(*) FROM meals").fetchone()[0]
+            batch_added = after_rows - before_rows
+
+        # Inserts grow the table, updates only count as changes
+        added += batch_added
+        updated += changes - batch_added
+        unchanged += len(batch) - changes
+
     conn.close()
-    print("\nImport complete!")
+    print(f"Import complete! Added: {added}, Updated: {updated}, Unchanged: {unchanged}")
+    return {"added": added, "updated": updated, "unchanged": unchanged}
 
 if __name__ == "__main__":
-    import_meals()
+    import_meals(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,19 @@
+# meal-library/migrate.py
+import os
+import sys
+
+# Allow running from meal-library/ without installing the app package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.db import get_db_path
+from app.schema import migrate
+
+def run_migrations():
+    db_path = get_db_path()
+    before, after = migrate(db_path)
+    if before == after:
+        print(f"{db_path} is already at schema version {after}.")
+    else:
+        print(f"Upgraded {db_path} from schema version {before} to {after}.")
+
+if __name__ == "__main__":
+    run_migrations()
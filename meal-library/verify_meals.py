@@ -1,12 +1,14 @@
 # meal-library/verify_meals.py
-import sqlite3
 import os
+import sys
 from tabulate import tabulate
 
-def verify_meals():
-    db_path = os.path.join(os.path.dirname(__file__), 'meal_library.db')
+# Allow running from meal-library/ without installing the app package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from app.db import connect, get_db_path
 
-    conn = sqlite3.connect(db_path)
+def verify_meals():
+    conn = connect(get_db_path())
     cursor = conn.cursor()
 
     # Check if the table exists
@@ -0,0 +1,57 @@
+# tests/test_combination_index.py
+import itertools
+import random
+from array import array
+
+from app.services.combination_index import (
+    build_combination_index,
+    build_index_set,
+    count_combinations,
+)
+from app.services.meal_catalog import MealGroup
+
+
+def group(calories):
+    meals = MealGroup()
+    for cal in sorted(calories):
+        meals.append("Meal", cal, 0.0, 0.0, 0.0, "Glen")
+    return meals
+
+
+def test_count_matches_enumeration():
+    rng = random.Random(3)
+    calories = sorted(rng.uniform(50, 500) for _ in range(40))
+    expected = sum(
+        1
+        for r in (1, 2, 3)
+        for combo in itertools.combinations(calories, r)
+        if sum(combo) <= 900
+    )
+
+    assert count_combinations(calories, 900, 3) == expected
+    assert len(build_combination_index(calories, [900 / 1.1], 3)) == expected
+
+
+def test_oversized_group_is_skipped_without_enumerating():
+    calories = array("d", [100.0] * 2000)
+
+    assert count_combinations(calories, 1000, 3, limit=1000) == 2000  # stopped early
+    assert build_combination_index(calories, [500], 3, max_combinations=1000) is None
+
+
+def test_unchanged_groups_reuse_the_previous_index():
+    plan = {"lunch": ([400], 3), "dinner": ([400], 3)}
+    lunch, dinner = group([100, 150, 200, 250]), group([120, 180, 240])
+    previous = build_index_set(
+        {("glen", "lunch"): lunch, ("glen", "dinner"): dinner}, plan
+    )
+
+    groups = {("glen", "lunch"): lunch, ("glen", "dinner"): group([130, 190])}
+    partial = build_index_set(groups, plan, previous, partial=True)
+    rebuilt = build_index_set(groups, plan, previous)
+
+    assert partial.get("lunch", "glen") is previous.get("lunch", "glen")
+    assert partial.get("dinner", "glen") is None
+    assert rebuilt.get("lunch", "glen") is previous.get("lunch", "glen")
+    assert len(rebuilt.get("dinner", "glen")) == 3
+    assert rebuilt.stats["reused_groups"] == 1
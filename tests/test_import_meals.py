@@ -0,0 +1,57 @@
+# tests/test_import_meals.py
+import csv
+import importlib.util
+import os
+
+import pytest
+
+from app import db
+
+SCRIPT = os.path.join(os.path.dirname(__file__), "..", "meal-library", "import_meals.py")
+CSV_FIELDS = ["name", "calories", "carbohydrates", "fat", "protein", "location", "meal_type"]
+
+
+@pytest.fixture
+def import_meals(tmp_path, monkeypatch):
+    monkeypatch.setenv("UFUEL_DB_PATH", str(tmp_path / "meals.db"))
+    spec = importlib.util.spec_from_file_location("import_meals", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    yield module.import_meals
+    db.close_all()
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return str(path)
+
+
+def meal(name, carbs=10, fat=5, protein=5, location="Glen", meal_type="lunch"):
+    return {
+        "name": name,
+        "calories": 0,
+        "carbohydrates": carbs,
+        "fat": fat,
+        "protein": protein,
+        "location": location,
+        "meal_type": meal_type,
+    }
+
+
+def test_fresh_import_counts_only_added_rows(tmp_path, import_meals, capsys):
+    path = write_csv(tmp_path / "meals.csv", [meal("Soup"), meal("Salad"), meal("Wrap")])
+
+    assert import_meals(path) == {"added": 3, "updated": 0, "unchanged": 0}
+    assert "Added: 3, Updated: 0, Unchanged: 0" in capsys.readouterr().out
+
+
+def test_reimport_counts_updated_and_unchanged_rows(tmp_path, import_meals):
+    import_meals(write_csv(tmp_path / "a.csv", [meal("Soup"), meal("Salad")]))
+
+    path = write_csv(
+        tmp_path / "b.csv", [meal("soup ", carbs=20), meal("Salad"), meal("Wrap")]
+    )
+    assert import_meals(path) == {"added": 1, "updated": 1, "unchanged": 1}
@@ -0,0 +1,73 @@
+# tests/test_macro_scoring.py
+import random
+
+import pytest
+
+from app import db, schema
+from app.services.meal_catalog import invalidate_catalog
+from app.services.meal_generator import FOOD_MAX_ITEMS, generate_meal_plan
+from app.services.meal_library_addition import add_meals
+
+# 2000 kcal/day: lunch food is 2000 * 0.35 * 0.8 = 560 kcal, so with
+# 140 kcal items only 4-item plates are within tolerance
+DAILY_CALORIES = 2000
+LUNCH_FOOD_CALORIES = DAILY_CALORIES * 0.35 * 0.8
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    path = str(tmp_path / "meals.db")
+    monkeypatch.setenv("UFUEL_DB_PATH", path)
+    schema.migrate(path)
+    # Same calories, but protein comes only from the few "Lean" items
+    meals = [meal(f"Lean {i}", carbs=0, protein=35) for i in range(3)]
+    meals += [meal(f"Starch {i}", carbs=35, protein=0) for i in range(10)]
+    assert add_meals(meals)["saved"] == len(meals)
+    yield path
+    invalidate_catalog(path)
+    db.close_all()
+
+
+def meal(name, carbs, protein, meal_type="lunch", location="Glen"):
+    return {
+        "name": name,
+        "carbohydrates": carbs,
+        "fat": 0,
+        "protein": protein,
+        "location": location,
+        "meal_type": meal_type,
+    }
+
+
+def test_unindexed_plate_size_is_scored_on_macros(library):
+    max_items = FOOD_MAX_ITEMS + 1  # not covered by the combination index
+    protein = LUNCH_FOOD_CALORIES / 4 / (0.35 * 0.8)  # all-protein lunch
+
+    plan = generate_meal_plan(
+        DAILY_CALORIES,
+        lunch_location="Glen",
+        db_path=library,
+        macro_targets={"protein": protein},
+        rng=random.Random(7),
+        max_items=max_items,
+    )
+
+    lunch = plan["plan"]["lunch"]
+    names = [m["name"] for m in lunch["meals"]]
+    assert len(names) == max_items
+    assert lunch["macros_applied"] is True
+    # A calorie-only pick would average one Lean item per plate
+    assert sum(name.startswith("Lean") for name in names) >= 2
+
+
+def test_macros_not_applied_without_in_range_combinations(library):
+    plan = generate_meal_plan(
+        DAILY_CALORIES * 4,
+        lunch_location="Glen",
+        db_path=library,
+        macro_targets={"protein": 100},
+        rng=random.Random(7),
+        max_items=FOOD_MAX_ITEMS + 1,
+    )
+
+    assert plan["plan"]["lunch"]["macros_applied"] is False
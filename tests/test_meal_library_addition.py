@@ -0,0 +1,52 @@
+# tests/test_meal_library_addition.py
+import threading
+
+import pytest
+
+from app import db, schema
+from app.services.meal_library_addition import add_meals, add_single_meal
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    path = str(tmp_path / "meals.db")
+    monkeypatch.setenv("UFUEL_DB_PATH", path)
+    schema.migrate(path)
+    yield path
+    db.close_all()
+
+
+def meal(name, carbs=10):
+    return {
+        "name": name,
+        "carbohydrates": carbs,
+        "fat": 5,
+        "protein": 5,
+        "meal_type": "lunch",
+        "location": "Glen",
+    }
+
+
+def test_stalled_upload_does_not_block_other_writers(library):
+    stalled = threading.Event()
+    added = {}
+
+    def upload():
+        yield meal("Soup")
+        stalled.set()
+        # Another writer gets in while the upload is still being read
+        writer = threading.Thread(
+            target=lambda: added.update(add_single_meal(meal("Wrap")))
+        )
+        writer.start()
+        writer.join()
+        yield meal("Soup", carbs=20)
+
+    result = add_meals(upload())
+
+    assert stalled.is_set()
+    assert "error" not in added
+    assert result["saved"] == 2
+    with db.connection() as conn:
+        rows = conn.execute("SELECT name, carbohydrates FROM meals ORDER BY name")
+        assert rows.fetchall() == [("Soup", 20.0), ("Wrap", 10.0)]
@@ -0,0 +1,38 @@
+# tests/test_meal_library_viewer.py
+import pytest
+
+from app import db, schema
+from app.services.meal_library_viewer import list_meals
+
+
+@pytest.fixture
+def library(tmp_path, monkeypatch):
+    path = str(tmp_path / "meals.db")
+    monkeypatch.setenv("UFUEL_DB_PATH", path)
+    schema.migrate(path)
+    with db.transaction() as conn:
+        conn.executemany(
+            """
+            INSERT INTO meals (name, calories, carbohydrates, fat, protein,
+                               meal_type, location)
+            VALUES (?, 100, 10, 5, 5, 'lunch', ?)
+            """,
+            [(f"Meal {i}", None if i % 3 == 0 else f"Hall {i % 4}") for i in range(20)],
+        )
+    yield path
+    db.close_all()
+
+
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_pages_include_rows_with_null_sort_values(library, order):
+    seen = []
+    cursor = None
+    while True:
+        page, error = list_meals(sort="location", order=order, limit=3, cursor=cursor)
+        assert error is None
+        seen += [m["id"] for m in page["meals"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert sorted(seen) == list(range(1, 21))
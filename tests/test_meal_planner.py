@@ -0,0 +1,31 @@
+# tests/test_meal_planner.py
+import pytest
+
+from app.services.meal_planner import generate_full_meal_plan
+
+PROFILE = {
+    "age": 20,
+    "height_in": 70,
+    "weight_lb": 170,
+    "gender": "male",
+    "activity_level": "moderate",
+    "goal": "maintain",
+    "breakfast_location": "",
+    "lunch_location": "",
+    "dinner_location": "",
+}
+
+
+@pytest.mark.parametrize(
+    "macros, message",
+    [
+        ({"macro_targets": [1, 2]}, "macro_targets must be an object"),
+        ({"macro_targets": {"fiber": 30}}, "Unknown macros: fiber"),
+        ({"macro_targets": {"protein": -5}}, "must be non-negative numbers: protein"),
+        ({"macro_targets": {"fat": "lots"}}, "must be non-negative numbers: fat"),
+        ({"macro_ratios": {"protein": 0.6, "carbs": 0.6}}, "add up to at most 1"),
+    ],
+)
+def test_invalid_macro_targets_are_rejected(macros, message):
+    with pytest.raises(ValueError, match=message):
+        generate_full_meal_plan({**PROFILE, **macros})